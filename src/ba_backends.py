@@ -0,0 +1,254 @@
+module_name = 'Bundle Adjustment Backends'
+
+'''
+Version: v1.0.0
+
+Description:
+    Solver backends driving the bundle adjustment. A backend takes
+    the bundle adjuster, the initial state and the mask of the fixed
+    params and returns the optimized state.
+
+        lm_backend   : hand-rolled Levenberg-Marquardt on the
+                       block-sparse normal equations
+        scipy_backend: scipy.optimize.least_squares (trust-region
+                       reflective) with robust losses
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    https://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.least_squares.html
+
+Notes:
+    <***>
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+from cam_state          import state
+import telemetry
+
+# OTHER IMPORTS
+from concurrent.futures import ThreadPoolExecutor
+from numpy              import linalg, sqrt, mean, power, maximum, inf, argmin
+from scipy.optimize     import least_squares
+from utils              import LM_INITIAL_DAMPING, LM_MAX_DAMPING, LM_GRADIENT_TOL, LM_STEP_TOL, LM_COST_TOL
+from utils              import SCIPY_NFEV_PER_ITR, SCIPY_LSMR_TOL, SCIPY_LSMR_MAX_ITR
+from utils              import LM_NUM_TRIALS, LM_TRIAL_DAMPING_STEP, BA_TRIAL_WORKERS
+
+# USER INTERFACE
+
+
+class lm_backend:
+    '''
+    Levenberg-Marquardt: the damping grows when a step is rejected
+    and shrinks when it is accepted. The normal equations are only
+    rebuilt after an accepted step, rejected steps reuse them.
+
+    With num_trials > 1 each iteration tries a ladder of damping values
+    around the current one, lambda * LM_TRIAL_DAMPING_STEP**k, solved
+    from one shared JtJ and evaluated in a thread pool (NumPy releases
+    the GIL). The trial with the lowest cost is kept, so an iteration
+    is only lost when every trial is rejected.
+    '''
+
+    def __init__(self, num_trials=LM_NUM_TRIALS, workers=BA_TRIAL_WORKERS):
+        '''
+        Input:
+        ------
+        num_trials: damping values tried per iteration
+        workers   : threads evaluating the trials, defaults to num_trials
+        '''
+        self._num_trials = num_trials
+        self._workers    = workers or num_trials
+    #
+
+    def _damping_ladder(self, lam):
+        first = -(self._num_trials // 2)
+        return [lam * LM_TRIAL_DAMPING_STEP**k for k in range(first, first + self._num_trials)]
+    #
+
+    def _try_steps(self, pool, ba, current_state, system, lams, diag, fixed):
+        '''
+        Evaluates one trial step per damping value
+
+        Output:
+        -------
+        Returns the (state, residuals, update, predicted) of every trial
+        '''
+        if len(lams) == 1:
+            return [ba._try_step(current_state, system, lams[0] * diag, fixed)]
+        # if
+
+        undamped = system.undamped(fixed)
+        return list(pool.map(lambda trial_lam: ba._try_step(current_state, system, trial_lam * diag, fixed, undamped), lams))
+    #
+
+    def solve(self, ba, initial_state, fixed, max_itr):
+        '''
+        Input:
+        ------
+        ba           : bundle adjuster
+        initial_state: state to start from
+        fixed        : mask of the params held fixed
+        max_itr      : maximum number of iterations
+
+        Output:
+        -------
+        Returns the best state found
+        '''
+        # Get the residual
+        init_residual = ba._reprojection_error(initial_state)
+        init_error    = sqrt(mean(power(init_residual,2)))
+
+        best_state     = initial_state
+        best_residuals = init_residual
+        best_error     = init_error
+        best_cost      = 0.5 * (best_residuals @ best_residuals)
+
+        system  = ba._solve_jacobian(best_state, best_residuals)
+        diag    = maximum(system.diagonal(), 1e-12)
+        lam     = LM_INITIAL_DAMPING
+        nu      = 2.0
+        reason  = 'max_itr'
+        num_itr = 0
+
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            for itr_count in range(max_itr):
+                num_itr = itr_count + 1
+
+                if (linalg.norm(system.gradient(fixed), inf) <= LM_GRADIENT_TOL):
+                    reason = 'gradient'
+                    break
+                # if
+
+                lams   = self._damping_ladder(lam)
+                trials = self._try_steps(pool, ba, best_state, system, lams, diag, fixed)
+
+                # Keep the trial with the lowest cost
+                costs      = [0.5 * (residuals @ residuals) for (_, residuals, _, _) in trials]
+                best_trial = int(argmin(costs))
+
+                next_state, next_residuals, param_update, predicted = trials[best_trial]
+
+                next_cost      = costs[best_trial]
+                next_error_val = sqrt(mean(next_residuals**2))
+                gain_ratio     = (best_cost - next_cost) / predicted if predicted > 0 else -1
+                step_norm      = linalg.norm(param_update)
+
+                telemetry.event('lm_iteration', itr=itr_count, rms=next_error_val, best_rms=best_error, damping=lams[best_trial],
+                                step_norm=step_norm, gain_ratio=gain_ratio, accepted=bool(gain_ratio > 0), trials=len(trials))
+
+                if (step_norm <= LM_STEP_TOL * (linalg.norm(best_state.params) + LM_STEP_TOL)):
+                    reason = 'step'
+                    break
+                # if
+
+                if (gain_ratio > 0):
+                    converged = (best_cost - next_cost) <= LM_COST_TOL * best_cost
+
+                    best_state     = next_state
+                    best_residuals = next_residuals
+                    best_error     = next_error_val
+                    best_cost      = next_cost
+
+                    if converged:
+                        reason = 'cost'
+                        break
+                    # if
+
+                    # Rebuild the system at the new state
+                    system = ba._solve_jacobian(best_state, best_residuals)
+                    diag   = maximum(diag, system.diagonal())
+                    lam    = lams[best_trial] * max(1/3, 1 - (2 * gain_ratio - 1)**3)
+                    nu     = 2.0
+                else:
+                    lam = lams[-1] * nu
+                    nu  = nu * 2
+
+                    if (lam > LM_MAX_DAMPING):
+                        reason = 'damping'
+                        break
+                    # if
+                # else
+            # for
+        # with
+
+        telemetry.event('ba_solve', backend='lm', initial_rms=init_error, final_rms=best_error, iterations=num_itr, reason=reason)
+
+        return best_state
+    #
+
+
+class scipy_backend:
+    '''
+    scipy.optimize.least_squares with the trust-region reflective method.
+    The jacobian is either our analytic sparse jacobian or finite
+    differences restricted to the sparsity pattern of the match graph.
+    Robust losses ('huber', 'cauchy', ...) keep a bad match from
+    stalling the convergence.
+    '''
+
+    def __init__(self, loss='linear', f_scale=1.0, jac='analytic'):
+        '''
+        Input:
+        ------
+        loss   : least_squares loss, 'linear', 'huber', 'soft_l1', 'cauchy' or 'arctan'
+        f_scale: inlier scale of the loss in pixels
+        jac    : 'analytic' or a finite difference scheme ('2-point', '3-point')
+        '''
+        self._loss    = loss
+        self._f_scale = f_scale
+        self._jac     = jac
+    #
+
+    def solve(self, ba, initial_state, fixed, max_itr):
+        '''
+        Input:
+        ------
+        ba           : bundle adjuster
+        initial_state: state to start from
+        fixed        : mask of the params held fixed
+        max_itr      : maximum number of iterations
+
+        Output:
+        -------
+        Returns the best state found
+        '''
+        free   = ~fixed
+        params = initial_state.params.copy()
+
+        def to_state(x):
+            full       = params.copy()
+            full[free] = x
+            return state(full)
+        #
+
+        def residuals(x):
+            return ba._reprojection_error(to_state(x))
+        #
+
+        if self._jac == 'analytic':
+            jac      = lambda x: ba._jacobian_matrix(to_state(x))[:, free]
+            sparsity = None
+        else:
+            jac      = self._jac
+            sparsity = ba._jacobian_sparsity().tocsc()[:, free]
+        # if
+
+        init_residual = residuals(params[free])
+
+        result = least_squares(residuals, params[free], jac=jac, jac_sparsity=sparsity, method='trf',
+                               tr_solver='lsmr', x_scale='jac', loss=self._loss, f_scale=self._f_scale,
+                               max_nfev=max_itr * SCIPY_NFEV_PER_ITR, ftol=LM_COST_TOL, xtol=LM_STEP_TOL, gtol=LM_GRADIENT_TOL,
+                               tr_options={'atol': SCIPY_LSMR_TOL, 'btol': SCIPY_LSMR_TOL, 'maxiter': SCIPY_LSMR_MAX_ITR})
+
+        telemetry.event('ba_solve', backend='scipy', initial_rms=sqrt(mean(power(init_residual,2))), final_rms=sqrt(mean(power(result.fun,2))),
+                        iterations=result.nfev, reason=result.message)
+
+        return to_state(result.x)
+    #
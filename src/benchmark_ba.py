@@ -0,0 +1,146 @@
+module_name = 'Benchmark BA'
+
+'''
+Version: v1.0.0
+
+Description:
+    Compares the bundle adjustment backends on a synthetic panorama
+    (cameras rotating about the vertical axis) on wall time and final
+    RMS error. Part of the matches can be corrupted with outliers to
+    see the effect of the robust losses.
+
+    python benchmark_ba.py --cameras 20 --points 300 --outliers 0.05
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    <***>
+
+Notes:
+    <***>
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+from ba_backends       import lm_backend, scipy_backend
+from bundle_adjustment import bundle_adjustment
+from camera            import Camera
+from match             import Match
+
+# OTHER IMPORTS
+from argparse                import ArgumentParser
+from numpy                   import array, eye, stack, tan, ones, sqrt, mean, float64, linalg, concatenate
+from numpy.random            import default_rng
+from scipy.spatial.transform import Rotation
+from time                    import perf_counter
+
+# USER INTERFACE
+FOCAL      = 700.0
+YAW_STEP   = 0.25
+FIELD_HALF = 0.3
+
+
+class synthetic_image:
+    def __init__(self, filename):
+        self.filename = filename
+    #
+
+
+def make_scene(num_cams, num_pts, noise, outliers, seed=0):
+    '''
+    Builds cameras with perturbed focal and rotation and matches between
+    every camera and its two next neighbours
+
+    Output:
+    -------
+    Returns the cameras, the matches and the mask of the clean points of each match
+    '''
+    rng   = default_rng(seed)
+    K     = array([[FOCAL, 0, 0], [0, FOCAL, 0], [0, 0, 1]], dtype=float64)
+    R_all = [Rotation.from_euler('y', YAW_STEP * i).as_matrix() for i in range(num_cams)]
+
+    cameras = []
+    for i in range(num_cams):
+        cam       = Camera(synthetic_image(f'synthetic_{i}.jpg'))
+        cam.focal = FOCAL * (1 + 0.05 * rng.normal())
+        cam.R     = eye(3) if i == 0 else Rotation.from_rotvec(Rotation.from_matrix(R_all[i]).as_rotvec() + rng.normal(0, 0.02, 3)).as_matrix()
+        cameras.append(cam)
+    # for
+
+    matches = []
+    clean   = []
+    for i in range(num_cams):
+        for j in (i + 1, i + 2):
+            if j >= num_cams:
+                continue
+            # if
+
+            # Rays seen by both cameras
+            rays = stack([tan(rng.uniform(-FIELD_HALF, FIELD_HALF, num_pts)),
+                          rng.uniform(-FIELD_HALF, FIELD_HALF, num_pts), ones(num_pts)], axis=1)
+            rays = rays @ Rotation.from_euler('y', YAW_STEP * (i + j) / 2).as_matrix()
+
+            pts_from = rays @ (K @ R_all[i]).T
+            pts_to   = rays @ (K @ R_all[j]).T
+            pts_from = pts_from[:, :2] / pts_from[:, 2:] + rng.normal(0, noise, (num_pts, 2))
+            pts_to   = pts_to[:, :2] / pts_to[:, 2:] + rng.normal(0, noise, (num_pts, 2))
+
+            bad = rng.random(num_pts) < outliers
+            pts_from[bad] += rng.uniform(-100, 100, (bad.sum(), 2))
+
+            H = K @ R_all[i] @ R_all[j].T @ linalg.inv(K)
+            matches.append(Match(cameras[i], cameras[j], H, [[a, b] for (a, b) in zip(pts_from, pts_to)]))
+            clean.append(~bad)
+        # for
+    # for
+    return cameras, matches, clean
+
+
+def run_backend(name, backend, args):
+    cameras, matches, clean = make_scene(args.cameras, args.points, args.noise, args.outliers)
+
+    ba = bundle_adjustment(max_points_per_match=None, backend=backend)
+    for match in matches:
+        ba.add(match)
+    # for
+
+    start = perf_counter()
+    ba.run_ba()
+    wall  = perf_counter() - start
+
+    # RMS over the clean points only, with the final cameras
+    residuals = []
+    for (match, keep) in zip(matches, clean):
+        pts    = array(match.inliers)[keep]
+        errors = pts[:, 0] - ba._project_points(ba._get_match_H(match.cam_from, match.cam_to), pts[:, 1])
+        residuals.append(errors.ravel())
+    # for
+    rms = sqrt(mean(concatenate(residuals)**2))
+
+    print(f'{name:<22} time: {wall:8.3f} s   RMS: {rms:.4f} px')
+
+
+def main():
+    parser = ArgumentParser(description='Bundle adjustment backend benchmark')
+    parser.add_argument('--cameras',  type=int,   default=12)
+    parser.add_argument('--points',   type=int,   default=300)
+    parser.add_argument('--noise',    type=float, default=0.5)
+    parser.add_argument('--outliers', type=float, default=0.0)
+    args = parser.parse_args()
+
+    run_backend('lm',                lm_backend(),                                    args)
+    run_backend('lm 3 trials',       lm_backend(num_trials=3),                        args)
+    run_backend('scipy trf',         scipy_backend(),                                 args)
+    run_backend('scipy trf 2-point', scipy_backend(jac='2-point'),                    args)
+    run_backend('scipy trf huber',   scipy_backend(loss='huber', f_scale=2.0),        args)
+    run_backend('scipy trf cauchy',  scipy_backend(loss='cauchy', f_scale=2.0),       args)
+#
+
+
+if __name__ == '__main__':
+    main()
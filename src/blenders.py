@@ -0,0 +1,204 @@
+module_name = 'Blenders'
+
+'''
+Version: v1.0.0
+
+Description:
+    Blending of the warped images of a tile. Stitch renders the canvas
+    tile by tile: it warps every camera intersecting the tile, grown
+    by the margin of the blender, and hands the parts to blend().
+
+        overwrite_blender: each image is pasted over the previous ones
+                           wherever its warped validity mask covers
+                           the canvas
+        multiband_blender: Laplacian pyramid (multi-band) blending,
+                           the low frequencies are blended over a wide
+                           band around the seams and the high ones over
+                           a narrow band
+
+    Each part is (cam, rect, image, weight), the rect in canvas
+    coordinates and the weight warped along with the image, positive
+    where the image covers the canvas: the distance to the image
+    border, or a plain validity mask for the overwrite blender. With
+    seams the weight is zero past the seam of the image.
+
+    blend() returns the tile image and its coverage, the pixels some
+    image was written to. Black image pixels are covered like any
+    other.
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    Burt, Adelson: A multiresolution spline with application to image
+    mosaics (1983)
+
+Notes:
+    The pyramids are only ever built over one tile plus its margin,
+    the memory does not grow with the panorama. The margin covers the
+    reach of the coarsest band so neighbouring tiles agree.
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+
+# OTHER IMPORTS
+import cv2   as cv
+import numpy as np
+from utils   import BLEND_MODE, BLEND_BANDS, BLEND_TILE_SIZE
+
+# USER INTERFACE
+
+
+class overwrite_blender:
+    '''
+    Every image is written where its weight is positive, over the
+    earlier ones
+    '''
+    margin          = 0
+    tile_size       = None
+    needs_weights   = False
+    bytes_per_pixel = 16    # Working memory per tile pixel, estimate
+
+    def blend(self, rect, parts):
+        (rx0, ry0, rx1, ry1) = rect
+        tile_img = np.zeros((ry1 - ry0, rx1 - rx0, 3), dtype=np.uint8)
+        coverage = np.zeros((ry1 - ry0, rx1 - rx0), dtype=bool)
+
+        for (_, (x0, y0, x1, y1), image, weight) in parts:
+            region = (slice(y0 - ry0, y1 - ry0), slice(x0 - rx0, x1 - rx0))
+            mask   = weight > 0
+
+            np.copyto(tile_img[region], image, where=mask[..., None])
+            coverage[region] |= mask
+        # for
+        return tile_img, coverage
+    #
+
+
+class multiband_blender:
+    '''
+    Every pixel goes to the image farthest from its own border there
+    (the largest warped weight). The Gaussian pyramids of these masks
+    weight the Laplacian pyramids of the images, which are summed,
+    normalised and collapsed
+    '''
+    needs_weights   = True
+    bytes_per_pixel = 96    # Working memory per tile pixel, estimate
+
+    def __init__(self, bands=BLEND_BANDS, tile_size=BLEND_TILE_SIZE):
+        '''
+        Input:
+        ------
+        bands    : number of Laplacian bands, 0 gives a hard seam
+        tile_size: tile of the in memory canvas, Stitch tiles with it
+                   when it has no tile size of its own
+        '''
+        self._bands    = bands
+        self.tile_size = tile_size
+        self.margin    = 4 * 2**bands if bands > 0 else 0
+    #
+
+    def _gaussian_pyramid(self, img):
+        pyramid = [img]
+        for _ in range(self._bands):
+            pyramid.append(cv.pyrDown(pyramid[-1]))
+        # for
+        return pyramid
+    #
+
+    def _laplacian_pyramid(self, img):
+        pyramid = []
+        current = img
+        for _ in range(self._bands):
+            down = cv.pyrDown(current)
+            pyramid.append(current - cv.pyrUp(down, dstsize=current.shape[1::-1]))
+            current = down
+        # for
+        pyramid.append(current)
+        return pyramid
+    #
+
+    def blend(self, rect, parts):
+        (rx0, ry0, rx1, ry1) = rect
+        h, w = ry1 - ry0, rx1 - rx0
+
+        # Padded to a multiple of 2^bands so every level halves exactly
+        step = 2**self._bands
+        H, W = -(-h // step) * step, -(-w // step) * step
+
+        # Image with the largest weight at each pixel
+        best_weight = np.zeros((H, W), dtype=np.float32)
+        owner       = np.full((H, W), -1, dtype=np.int32)
+        for (part_id, (_, (x0, y0, x1, y1), _, weight)) in enumerate(parts):
+            region = (slice(y0 - ry0, y1 - ry0), slice(x0 - rx0, x1 - rx0))
+            better = weight > best_weight[region]
+
+            best_weight[region][better] = weight[better]
+            owner[region][better]       = part_id
+        # for
+
+        blended = None
+        weights = None
+        for (part_id, (_, (x0, y0, x1, y1), image, _)) in enumerate(parts):
+            placed = np.zeros((H, W, 3), dtype=np.float32)
+            placed[y0 - ry0:y1 - ry0, x0 - rx0:x1 - rx0] = image
+
+            laplacian = self._laplacian_pyramid(placed)
+            gaussian  = self._gaussian_pyramid((owner == part_id).astype(np.float32))
+
+            if blended is None:
+                blended = [np.zeros_like(level) for level in laplacian]
+                weights = [np.zeros_like(level) for level in gaussian]
+            # if
+
+            for level in range(self._bands + 1):
+                blended[level] += laplacian[level] * gaussian[level][..., None]
+                weights[level] += gaussian[level]
+            # for
+        # for
+
+        tile_img = np.zeros((h, w, 3), dtype=np.uint8)
+        if blended is None:
+            return tile_img, np.zeros((h, w), dtype=bool)
+        # if
+
+        # Normalise each band and collapse the pyramid
+        for level in range(self._bands + 1):
+            blended[level] /= np.maximum(weights[level], 1e-5)[..., None]
+        # for
+
+        result = blended[-1]
+        for level in range(self._bands - 1, -1, -1):
+            result = cv.pyrUp(result, dstsize=blended[level].shape[1::-1]) + blended[level]
+        # for
+
+        covered           = owner[:h, :w] >= 0
+        tile_img[covered] = np.clip(result[:h, :w][covered], 0, 255).astype(np.uint8)
+        return tile_img, covered
+    #
+
+
+BLENDERS = {'overwrite': overwrite_blender, 'multiband': multiband_blender}
+
+
+def make_blender(mode=BLEND_MODE, **kwargs):
+    '''
+    Input:
+    ------
+    mode  : 'overwrite' or 'multiband'
+    kwargs: bands and tile_size of the multiband blender
+    '''
+    if mode not in BLENDERS:
+        raise ValueError(f'Unknown blend mode {mode}, expected one of {sorted(BLENDERS)}')
+    # if
+
+    if mode == 'overwrite':
+        return overwrite_blender()
+    # if
+    return BLENDERS[mode](**kwargs)
+#
@@ -25,22 +25,35 @@ ToDo:
 '''
 
 # CUSTOM IMPORTS
-from cam_state   import state
+from ba_backends      import lm_backend
+from cam_state        import state
+from kernels          import dH_homo_coord
+from normal_equations import normal_equations
+import telemetry
 
 # OTHER IMPORTS
-from numpy       import zeros, linalg, hstack, array, subtract, sqrt, mean, float64, identity, cross, multiply, power, copy
+from numpy       import zeros, hstack, vstack, subtract, sqrt, mean, float64, identity, cross, asarray, ascontiguousarray, divide, ones, where
+from numpy       import allclose, maximum, minimum, arange, argsort, searchsorted, lexsort, sort, ceil, repeat, tile
+from numpy.random import default_rng
 from ordered_set import OrderedSet
-from random      import normalvariate
-from utils       import PARAMS_PER_CAMERA, PARAMS_PER_POINT_MATCHES, REGULARISATION_PARAM, MAX_ITR, FOCAL_DERIVATIVE, PPX_DERIVATIVE, PPY_DERIVATIVE
+from scipy.sparse import csr_matrix, lil_matrix
+from utils       import PARAMS_PER_CAMERA, PARAMS_PER_POINT_MATCHES, MAX_ITR, INTRINSIC_DERIVATIVES
+from utils       import BA_MAX_POINTS_PER_MATCH, BA_SAMPLING_SEED
 
 # USER INTERFACE
 
 
 class bundle_adjustment:
-    def __init__(self):
-        self._matches    = []
-        self.match_count = []
-        self._cameras    = OrderedSet()
+    def __init__(self, max_points_per_match=BA_MAX_POINTS_PER_MATCH, backend=None):
+        self._matches              = []
+        self._sampled_pts          = []
+        self._all_pts              = []
+        self._match_pts            = self._sampled_pts
+        self._match_cams           = []
+        self._cameras              = OrderedSet()
+        self._active_matches       = None
+        self._max_points_per_match = max_points_per_match
+        self._backend              = lm_backend() if backend is None else backend
     #
 
     def matches(self):
@@ -53,15 +66,22 @@ class bundle_adjustment:
 
         Input:
         ------
-        v: 3D vector containing [x, y, z]
+        v: 3D vector containing [x, y, z], or a (..., 3) stack of them
 
         Output:
         ------
-        Returns skew matrix
+        Returns (..., 3, 3) skew matrix
         '''
-        x, y, z = v
-        return array([[0, -z, y], [z, 0, -x], [-y, x, 0]], 
-                     dtype=float64)
+        v    = asarray(v, dtype=float64)
+        skew = zeros(v.shape[:-1] + (3, 3), dtype=float64)
+
+        skew[..., 0, 1] = -v[..., 2]
+        skew[..., 0, 2] =  v[..., 1]
+        skew[..., 1, 0] =  v[..., 2]
+        skew[..., 1, 2] = -v[..., 0]
+        skew[..., 2, 0] = -v[..., 1]
+        skew[..., 2, 1] =  v[..., 0]
+        return skew
     #
 
     def _get_match_H(self, cam_pt_from, cam_pt_to):
@@ -78,106 +98,158 @@ class bundle_adjustment:
         -------
         Returns Hmomography
         '''
-        mat_K = cam_pt_from.K
-        mat_R = cam_pt_from.R
+        H_match = cam_pt_from.KR @ cam_pt_to.KR_inv
 
-        inv_K_from = linalg.pinv(cam_pt_to.K)
-        inv_R_to   = cam_pt_to.R.T
+        return H_match
+    #
 
-        H_match    = (mat_K @ mat_R) @ (inv_R_to @ inv_K_from)
+    def _state_match_H(self, state, from_id, to_id):
+        '''
+        Computes the homography of a match from the cached stacks 
+        of the state
 
-        return H_match
+        Input:
+        ------
+        state  : camera state
+        from_id: index of the camera mapping from
+        to_id  : index of the camera mapping to
+
+        Output:
+        -------
+        Returns Hmomography
+        '''
+        return (state.K[from_id] @ state.R[from_id]) @ (state.R[to_id].T @ state.K_inv[to_id])
     #
 
     def _dR_dv(self, v, Rot_mat):
         '''
         Change of the rotation in the 
-        x, y and z direction
+        x, y and z direction, for all cameras at once
+
+        dR/dv_i = (v_i [v]x + [v x (I - R) e_i]x) R / |v|^2
 
         Input:
         ------
-        v       : 3D vector containing [x, y, z]
-        Rot_mat : Rotation matrix
+        v       : (C, 3) rotation vectors
+        Rot_mat : (C, 3, 3) rotation matrices
+
+        Output:
+        -------
+        Returns (C, 3, 3, 3) derivatives, dRv[c, i] = dR_c/dv_i
         '''
-        x, y, z = v
-        
-        if linalg.norm(v) < 1e-14:
-            return array([self._skew_matrix([1, 0, 0]),
-                          self._skew_matrix([0, 1, 0]),
-                          self._skew_matrix([0, 0, 1])])
-        # if
+        theta_sqr = (v**2).sum(axis=1)
+        small     = theta_sqr < 1e-28
+        theta_sqr = where(small, 1, theta_sqr)
 
-        dRx = self._skew_matrix(v) * x
-        dRy = self._skew_matrix(v) * y
-        dRz = self._skew_matrix(v) * z
+        # Identity - Rotation, its columns crossed with v
+        I_minus_R = identity(3) - Rot_mat
+        crossed   = cross(v[:, None, :], I_minus_R.transpose(0, 2, 1))
 
-        dRv = [dRx, dRy, dRz]
+        dRv  = v[:, :, None, None] * self._skew_matrix(v)[:, None] + self._skew_matrix(crossed)
+        dRv /= theta_sqr[:, None, None, None]
+        dRv  = dRv @ Rot_mat[:, None]
 
-        # Identity - Rotation
-        I_minus_R = identity(3) - Rot_mat
+        # Close to the identity the derivatives are the generators
+        dRv[small] = self._skew_matrix(identity(3))
 
-        for v_id in range(len(v)):
-            x_, y_, z_ = cross(array(v),I_minus_R[:,v_id])
-            dRv[v_id]  += self._skew_matrix([x_, y_, z_])
-            dRv[v_id]  = multiply(dRv[v_id], 1/linalg.norm(v))
-            dRv[v_id]  = dRv[v_id] @ Rot_mat
-        # for
         return dRv
     #
 
-    def _make_homogenous(self, pt):
+    def _dH_homo_coord(self, dhdv, homo):
         '''
-        Converts coordinate points to homogenous points
+        Computes the derivatives of the reprojection error from the 
+        derivatives of the homogenous coordinates for all points at once
 
         Input:
         ------
-        pt: cartesian coordinate
+        dhdv: (P, N, 3) partial derivative of the homogenous vector [hx, hy, hz] w.r.t each of the P params
+        homo: (N, 3) homogenous points [hx, hy, hz]
 
         Output:
         -------
-        Returns homogenous coordinate
+        Returns (P, N, 2) derivatives of the reprojection error
         '''
-        return hstack([pt, [1]])
+        return dH_homo_coord(dhdv, homo)
     #
 
-    def _camera_to_image_coordinate(self, pt, H, usedivide=None):
+    def _match_jacobian(self, state, from_id, to_id, all_dRdv, to_pts):
         '''
-        Projects a point using the Homography back to 
-        cartesian coordinate
+        Computes the derivatives of all the points of a match w.r.t 
+        the params of both cameras in one batch
 
         Input:
         ------
-        pt: cartesian coordinate
-        H : Homography matrix
-        '''
-        if len(pt) == 2:
-            get_hom_coord = self._make_homogenous(pt)
-            proj          = H @ get_hom_coord
-            if usedivide:
-                return array([proj[0]/proj[2], proj[1]/proj[2]])
-        else:
-            proj = H @ pt
-        # if
-        return proj
+        state   : camera state
+        from_id : index of the camera mapping from
+        to_id   : index of the camera mapping to
+        all_dRdv: (C, 3, 3, 3) derivatives of the rotations
+        to_pts  : (N, 2) points in cam_to
+
+        Output:
+        -------
+        Returns (2N, 12) jacobian block, the first 6 columns belong to 
+        cam_from and the last 6 to cam_to
+        '''
+        K_from   = state.K[from_id]
+        R_from   = state.R[from_id]
+        RK_to    = state.R[to_id].T @ state.K_inv[to_id]
+        inv_K_to = state.K_inv[to_id]
+        H_cam    = K_from @ R_from @ RK_to
+
+        # Each derivative of the homography is a 3x3 matrix applied to the points
+        dH_from = vstack([INTRINSIC_DERIVATIVES @ (R_from @ RK_to),
+                          K_from @ all_dRdv[from_id] @ RK_to])
+        dH_to   = vstack([-(H_cam @ INTRINSIC_DERIVATIVES @ inv_K_to),
+                          (K_from @ R_from) @ all_dRdv[to_id].transpose(0, 2, 1) @ inv_K_to])
+        dH      = vstack([dH_from, dH_to])
+
+        homo_pts = hstack([to_pts, ones((len(to_pts), 1))])
+        dhdv     = homo_pts @ dH.transpose(0, 2, 1)
+        dE       = self._dH_homo_coord(dhdv, homo_pts @ H_cam.T)
+
+        return dE.transpose(1, 2, 0).reshape(-1, 2 * PARAMS_PER_CAMERA)
     #
 
-    def _dH_homo_coord(self, dhdv, homo, hz_inv, hz_sqr_inv):
+    def _project_points(self, H, pts):
         '''
-        Computes the derivatives of the homogenous coordinates 
+        Projects all the points of a match using the Homography 
+        back to cartesian coordinate in one batch
 
         Input:
         ------
-        dhdv      : partial derivative of the homogenous vector [hx, hy, hz] w.r.t with vector v
-        homo      : 2D inhomogenous point
-        hz_inv    : 1/hz
-        hz_sqr_inv: 1/hz**2
-        '''
-        return array([-dhdv[0] * hz_inv + dhdv[2] * homo[0] * hz_sqr_inv,
-                      -dhdv[1] * hz_inv + dhdv[2] * homo[1] * hz_sqr_inv],
-                      dtype=float64)
+        H  : Homography matrix
+        pts: (N, 2) cartesian coordinates
+
+        Output:
+        -------
+        Returns (N, 2) projected cartesian coordinates
+        '''
+        proj  = pts @ H[:, :2].T
+        proj += H[:, 2]
+        return divide(proj[:, :2], proj[:, 2:3])
     #
 
+    def _match_layout(self):
+        '''
+        Gets the matches taking part in the current optimization and
+        where their residuals start
 
+        Output:
+        -------
+        Returns a list of (match id, residual offset) and the number of residuals
+        '''
+        active = range(len(self._matches)) if self._active_matches is None else self._active_matches
+
+        layout = []
+        offset = 0
+        for match_id in active:
+            layout.append((match_id, offset))
+            offset += len(self._match_pts[match_id][0]) * PARAMS_PER_POINT_MATCHES
+        # for
+        return layout, offset
+    #
+
+    @telemetry.timed('residual')
     def _reprojection_error(self, state):
         '''
         Computes the reprojection error of the extrinisic and 
@@ -189,229 +261,243 @@ class bundle_adjustment:
 
         Output:
         ------
-        Returns reprojection error
+        Returns reprojection error laid out as [x0, y0, x1, y1, ...]
+        following the order the active matches were added
         '''
-        current_camera_state = state.cameras #cameras added
-
         # Get the number of inlier points from each image
-        pairwise_matches = sum(len(match.inliers) for match in self._matches)
-        reproj_error     = zeros((pairwise_matches * PARAMS_PER_POINT_MATCHES))
+        layout, num_residuals = self._match_layout()
+        reproj_error          = zeros((num_residuals), dtype=float64)
 
-        for match in self._matches:
-            # cam pt image --> cam pt image 2
-            cam_pt_from = current_camera_state[self._cameras.index(match.cam_from)]
-            cam_pt_to   = current_camera_state[self._cameras.index(match.cam_to)]
+        for (match_id, start_idx) in layout:
+            match              = self._matches[match_id]
+            from_pts, to_pts   = self._match_pts[match_id]
+            from_id, to_id     = self._match_cams[match_id]
 
             # Get the extrinisic and intrinsic paramters
-            H_match = self._get_match_H(cam_pt_from, cam_pt_to)
-
-            # Get the points in the inliers
-            for num_id, pt in zip(range(0, len(match.inliers), 2), match.inliers):
-                from_pt_coord = pt[0]
-                to_pt_coord   = pt[1]
+            H_match = self._state_match_H(state, from_id, to_id)
 
-                # Get the projected cartesian coordinate
-                pixel_coord            = self._camera_to_image_coordinate(to_pt_coord, H_match, usedivide=True)
-                reproj_error[num_id]   = subtract(from_pt_coord[0], pixel_coord[0])
-                reproj_error[num_id+1] = subtract(from_pt_coord[1], pixel_coord[1])
-            # for 
+            # Write the residuals of the match straight into its slots
+            end_idx     = start_idx + len(from_pts) * PARAMS_PER_POINT_MATCHES
+            match_error = reproj_error[start_idx:end_idx].reshape(-1, PARAMS_PER_POINT_MATCHES)
+            subtract(from_pts, self._project_points(H_match, to_pts), out=match_error)
 
-            print(f"Error: {sqrt(mean(reproj_error**2))}, Match from {match.cam_from.image.filename} to {match.cam_to.image.filename}:")
+            if telemetry.enabled():
+                telemetry.event('match_error', cam_from=match.cam_from.image.filename, cam_to=match.cam_to.image.filename,
+                                rms=sqrt(mean(match_error**2)))
+            # if
         # for
         return reproj_error
     #
 
-    def _solve_jacobian(self, state):
+    def _rotation_derivatives(self, state):
         '''
-        Solves the Jacobian matrix
+        Derivatives of the rotation of every camera w.r.t its 
+        rotation vector
         '''
-        
-        # get the parameters and cameras
-        params  = state.params
-        cameras = state.cameras
+        return self._dR_dv(state.rotvecs, state.R)
+    #
+
+    @telemetry.timed('jacobian')
+    def _jacobian_matrix(self, state):
+        '''
+        Assembles the jacobian of the active matches as a sparse matrix,
+        used by backends that need J itself rather than JtJ
 
-        num_cams = len(cameras)
-        num_pointwise_matches = sum(len(match.inliers) for match in self._matches)
+        Output:
+        -------
+        Returns J as a scipy csr matrix
+        '''
+        all_dRdv = self._rotation_derivatives(state)
 
-        J   = zeros((PARAMS_PER_POINT_MATCHES * num_pointwise_matches, PARAMS_PER_CAMERA * num_cams), dtype=float64)
-        JtJ = zeros((PARAMS_PER_CAMERA * num_cams, PARAMS_PER_CAMERA * num_cams), dtype=float64)
+        layout, num_residuals = self._match_layout()
+        rows, cols, vals      = [], [], []
+        for (match_id, offset) in layout:
+            _, to_pts      = self._match_pts[match_id]
+            from_id, to_id = self._match_cams[match_id]
 
-        all_dRdv = []
+            J_match = self._match_jacobian(state, from_id, to_id, all_dRdv, to_pts)
 
-        for cam_id in range(len(cameras)):
-            num_param = cam_id * PARAMS_PER_CAMERA # Have a feeling this has to change
+            rows.append(repeat(arange(offset, offset + len(J_match)), 2 * PARAMS_PER_CAMERA))
+            cols.append(tile(self._match_columns(from_id, to_id), len(J_match)))
+            vals.append(J_match.ravel())
+        # for
 
-            # Get the x, y, z coordinates from the camera
-            x, y, z = params[num_param+3:num_param+6]
+        return csr_matrix((hstack(vals), (hstack(rows), hstack(cols))),
+                          shape=(num_residuals, state.num_cameras * PARAMS_PER_CAMERA))
+    #
+
+    def _jacobian_sparsity(self):
+        '''
+        Sparsity pattern of the jacobian of the active matches, derived 
+        from the match graph: the rows of a match only depend on the
+        params of its two cameras
+        '''
+        layout, num_residuals = self._match_layout()
+        pattern               = lil_matrix((num_residuals, len(self._cameras) * PARAMS_PER_CAMERA), dtype=int)
 
-            # Get the change of direction in the x, y , z direction with the rotation
-            dRdv = self._dR_dv([x,y,z], cameras[cam_id].R)
-            all_dRdv.append(dRdv)
+        for (match_id, offset) in layout:
+            num_pts = len(self._match_pts[match_id][0])
+            rows    = slice(offset, offset + num_pts * PARAMS_PER_POINT_MATCHES)
+
+            pattern[rows, self._match_columns(*self._match_cams[match_id])] = 1
         # for
+        return pattern
+    #
+
+    def _match_columns(self, from_id, to_id):
+        '''
+        Params columns of a match, cam_from first
+        '''
+        return hstack([arange(from_id * PARAMS_PER_CAMERA, (from_id+1) * PARAMS_PER_CAMERA),
+                       arange(to_id * PARAMS_PER_CAMERA, (to_id+1) * PARAMS_PER_CAMERA)])
+    #
+
+    @telemetry.timed('jacobian')
+    def _solve_jacobian(self, state, residuals):
+        '''
+        Solves the Jacobian matrix match by match and folds it 
+        into the block-sparse normal equations
+
+        Input:
+        ------
+        state    : camera state the jacobian is evaluated at
+        residuals: reprojection error of the state
+
+        Output:
+        -------
+        Returns the normal equations
+        '''
+        
+        # get the rotation derivatives of all the cameras
+        system   = normal_equations(state.num_cameras)
+        all_dRdv = self._rotation_derivatives(state)
+
+        layout, _ = self._match_layout()
 
-        for (i, match) in enumerate(self._matches):
-            num_match_count_idx = self.match_count[i] * 2
+        for (match_id, num_match_count_idx) in layout:
+            _, to_pts = self._match_pts[match_id]
 
             # Get the camera from and camera to
-            cam_from = cameras[self._cameras.index(match.cam_from)]
-            cam_to   = cameras[self._cameras.index(match.cam_to)]
-
-            params_from_cam = self._cameras.index(match.cam_from) * PARAMS_PER_CAMERA
-            params_to_cam   = self._cameras.index(match.cam_to) * PARAMS_PER_CAMERA
-
-            H_cam     = self._get_match_H(cam_from, cam_to)
-            dR_from_v = all_dRdv[self._cameras.index(match.cam_from)]
-            dR_to_v   = copy(all_dRdv[self._cameras.index(match.cam_to)])
-            dR_to_vT  = [m.T for m in dR_to_v]
-
-            for (pair_id, pair) in enumerate(match.inliers):
-                coord = pair[1]
-                new_coord = self._camera_to_image_coordinate(coord, H_cam, usedivide=False)
-                hz_sqr_inv = 1.0/ power(new_coord[2],2)
-                hz_inv     = 1.0 / new_coord[2]
-
-                dFrom = zeros((PARAMS_PER_CAMERA, PARAMS_PER_POINT_MATCHES))
-                dTo   = zeros((PARAMS_PER_CAMERA, PARAMS_PER_POINT_MATCHES))
-
-                homo_m = cam_from.R @ cam_to.R.T @ linalg.pinv(cam_to.K)
-                dot_u2 = self._camera_to_image_coordinate(coord, homo_m, usedivide=False)
-
-                # Get the array for dFrom
-                dFrom[0] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2, FOCAL_DERIVATIVE, usedivide=False),
-                                              new_coord,hz_inv, hz_sqr_inv)
-                dFrom[1] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2, PPX_DERIVATIVE, usedivide=False),
-                                              new_coord,hz_inv, hz_sqr_inv)
-                dFrom[2] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2, PPY_DERIVATIVE, usedivide=False), 
-                                              new_coord,hz_inv, hz_sqr_inv)
-                
-                dot_u2 = self._camera_to_image_coordinate(coord, (cam_to.R.T @ linalg.pinv(cam_to.K)), usedivide=False)
-                dFrom[3] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2,(cam_from.K @ dR_from_v[0]), usedivide=False), 
-                                              new_coord,hz_inv, hz_sqr_inv)
-                dFrom[4] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2,(cam_from.K @ dR_from_v[1]), usedivide=False), 
-                                              new_coord,hz_inv, hz_sqr_inv)
-                dFrom[5] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2,(cam_from.K @ dR_from_v[2]), usedivide=False), 
-                                              new_coord,hz_inv, hz_sqr_inv)
-                
-                # Get the array for dTo
-                dot_u2 = -1 * self._camera_to_image_coordinate(coord, linalg.pinv(cam_to.K), usedivide=False)
-                dTo[0] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2,(H_cam @ FOCAL_DERIVATIVE), usedivide=False),
-                                            new_coord, hz_inv, hz_sqr_inv)
-                dTo[1] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2,(H_cam @ PPX_DERIVATIVE), usedivide=False), 
-                                            new_coord, hz_inv, hz_sqr_inv)
-                dTo[2] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2,(H_cam @ PPY_DERIVATIVE), usedivide=False), 
-                                            new_coord, hz_inv, hz_sqr_inv)
-                
-                hMtrx = cam_from.K @ cam_from.R
-                dot_u2 = self._camera_to_image_coordinate(coord, linalg.pinv(cam_to.K))
-                dTo[3] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2,(hMtrx @ dR_to_vT[0]), usedivide=False), 
-                                            new_coord, hz_inv, hz_sqr_inv)
-                dTo[4] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2,(hMtrx @ dR_to_vT[1]), usedivide=False), 
-                                            new_coord, hz_inv, hz_sqr_inv)
-                dTo[5] = self._dH_homo_coord(self._camera_to_image_coordinate(dot_u2,(hMtrx @ dR_to_vT[2]), usedivide=False), 
-                                            new_coord, hz_inv, hz_sqr_inv)
-                
-                for param_idx in range(PARAMS_PER_CAMERA):
-                    J[num_match_count_idx, params_from_cam + param_idx]   = dFrom[param_idx][0]
-                    J[num_match_count_idx, params_to_cam + param_idx]     = dTo[param_idx][0]
-                    J[num_match_count_idx+1, params_from_cam + param_idx] = dFrom[param_idx][1]
-                    J[num_match_count_idx+1, params_to_cam + param_idx]   = dTo[param_idx][1]
-                # for
-
-                for param_idx_i in range(PARAMS_PER_CAMERA):
-                    for param_idx_j in range(PARAMS_PER_CAMERA):
-                        i1          = params_from_cam + param_idx_i
-                        i2          = params_to_cam + param_idx_j
-                        val         = dFrom[param_idx_i] @ dTo[param_idx_j]
-                        JtJ[i1][i2] += val
-                        JtJ[i2][i1] += val
-                    # for 
-                # for
-
-                for param_idx_i in range(PARAMS_PER_CAMERA):
-                    for param_idx_j in range(param_idx_i, PARAMS_PER_CAMERA):
-                        i1          = params_from_cam + param_idx_i
-                        i2          = params_from_cam + param_idx_j
-                        val         = dFrom[param_idx_i] @ dFrom[param_idx_j]
-                        JtJ[i1][i2] += val
-
-                        if (param_idx_i != param_idx_j):
-                            JtJ[i2][i1] += val
-                        # if
-                    
-                        i1          = params_to_cam + param_idx_i
-                        i2          = params_to_cam + param_idx_j
-                        val         = dTo[param_idx_i] @ dTo[param_idx_j]
-                        JtJ[i1][i2] += val
-
-                        if (param_idx_i != param_idx_j):
-                            JtJ[i2][i1] += val
-                        # if
-                    # for
-                # for
-                num_match_count_idx += 2
-            # for
-        return J, JtJ
+            from_id, to_id = self._match_cams[match_id]
+
+            J_match = self._match_jacobian(state, from_id, to_id, all_dRdv, to_pts)
+
+            system.add_match(from_id, to_id, J_match,
+                             residuals[num_match_count_idx:num_match_count_idx + len(J_match)])
+        # for
+        return system
     #
 
-    def run_ba(self):
+    def _fixed_params(self, free_cameras=None):
         '''
-        Runs the bundle adjusment class
+        Mask of the params held fixed during the optimization,
+        the rotation of the reference (identity) camera and every
+        camera outside free_cameras when given
         '''
-        
-        if len(self._matches) < 1:
-            raise ValueError('Must have at least one match')
+        fixed = zeros((len(self._cameras) * PARAMS_PER_CAMERA), dtype=bool)
+
+        if free_cameras is not None:
+            for (cam_id, cam) in enumerate(self._cameras):
+                if cam not in free_cameras:
+                    fixed[cam_id*PARAMS_PER_CAMERA:(cam_id+1)*PARAMS_PER_CAMERA] = True
+                # if
+            # for
         # if
 
-        print('Running Bundle Adjustment...')
+        for (cam_id, cam) in enumerate(self._cameras):
+            if allclose(cam.R, identity(3)):
+                fixed[cam_id*PARAMS_PER_CAMERA+3:(cam_id+1)*PARAMS_PER_CAMERA] = True
+                break
+            # if
+        # for
+        return fixed
+    #
 
-        # Get the initial state of the camera for the images
-        initial_state = state()
-        initial_state.set_initial_cameras(self._cameras)
+    def _try_step(self, current_state, system, damping, fixed, undamped=None):
+        '''
+        Solves the damped system and evaluates the resulting state.
+        Safe to call from several threads on the same system
+
+        Input:
+        ------
+        current_state: state the system was built at
+        system       : normal equations of current_state
+        damping      : vector added to the diagonal of JtJ
+        fixed        : mask of the params held fixed
+        undamped     : optional undamped JtJ shared between trial steps
 
-        # Get the residual
-        init_residual = self._reprojection_error(initial_state)
-        init_error    = sqrt(mean(power(init_residual,2)))
+        Output:
+        -------
+        Returns the next state, its residuals, the update and the 
+        reduction of the cost predicted by the linear model
+        '''
+        param_update   = self._get_next_update(system, damping, fixed, undamped)
+        next_state     = current_state.updatedState(param_update)
+        next_residuals = self._reprojection_error(next_state)
 
-        print(f'Initial_error: {init_error}')
+        predicted = 0.5 * param_update @ (damping * param_update + system.gradient(fixed))
 
-        itr_count          = 0
-        non_decrease_count = 0
-        best_state         = initial_state
-        best_residuals     = init_residual
-        best_error         = init_error
+        return next_state, next_residuals, param_update, predicted
+    #
 
-        while (itr_count < MAX_ITR):
+    def neighbours(self, cam):
+        '''
+        Cameras sharing an added match with cam
+        '''
+        neighbours = set()
+        for match in self._matches:
+            if cam in match.cams():
+                neighbours.update(match.cams())
+            # if
+        # for
+        neighbours.discard(cam)
 
-            J, JtJ       = self._solve_jacobian(best_state)
-            param_update = self._get_next_update(J, JtJ, best_residuals)
-            next_state   = best_state.updatedState(param_update)
+        return neighbours
+    #
 
-            next_residuals = self._reprojection_error(next_state)
-            next_error_val = sqrt(mean(next_residuals**2))
-            print(f'Next error: {next_error_val}')
+    def run_ba(self, free_cameras=None, max_itr=MAX_ITR, all_points=False):
+        '''
+        Runs the bundle adjusment class with the solver backend
 
-            if (next_error_val >= best_error - 1e-3):
-                non_decrease_count += 1
-            else:
-                print('Updating state to new best state')
-                non_decrease_count = 0
-                best_error = next_error_val
+        The state starts from the current camera params, so repeated
+        runs are warm started.
 
-                best_state     = next_state
-                best_residuals = next_residuals
-            # else
+        Input:
+        ------
+        free_cameras: optional cameras to optimize, the others are held 
+                      fixed and only matches touching a free camera are used
+        max_itr     : maximum number of iterations
+        all_points  : use every inlier instead of the per match subset, 
+                      for a final polish after convergence
+        '''
         
-            if (non_decrease_count > 5):
-                break
-            # if
-        # while
+        if len(self._matches) < 1:
+            raise ValueError('Must have at least one match')
+        # if
+
+        self._match_pts = self._all_pts if all_points else self._sampled_pts
+
+        if free_cameras is None:
+            self._active_matches = None
+        else:
+            self._active_matches = [match_id for (match_id, match) in enumerate(self._matches)
+                                    if (match.cam_from in free_cameras or match.cam_to in free_cameras)]
+        # if
+
+        # Get the initial state of the camera for the images
+        initial_state = state()
+        initial_state.set_initial_cameras(self._cameras)
+        fixed         = self._fixed_params(free_cameras)
+
+        telemetry.event('ba_run', cameras=len(self._cameras), free_cameras=None if free_cameras is None else len(free_cameras),
+                        matches=len(self._match_layout()[0]), all_points=all_points, max_itr=max_itr)
 
-        print(f'BEST ERROR {best_error}')
+        best_state = self._backend.solve(self, initial_state, fixed, max_itr)
+        self._active_matches = None
 
         # Update actual camera object params
         new_cameras = best_state.cameras
         for cam_id in range(len(new_cameras)):
-            print(f'Final focal: {new_cameras[cam_id].focal}')
             self._cameras[cam_id].focal = new_cameras[cam_id].focal
             self._cameras[cam_id].ppx   = new_cameras[cam_id].ppx
             self._cameras[cam_id].ppy   = new_cameras[cam_id].ppy
@@ -419,39 +505,80 @@ class bundle_adjustment:
         # for
     #
 
-    def _get_next_update(self, J, JtJ, residuals):
-
-        # # Regularisation
-        l = normalvariate(1, 0.1)
-        for i in range(len(self._cameras) * PARAMS_PER_CAMERA):
-            if (i % PARAMS_PER_CAMERA >= 3):
-                # TODO: Improve regularisation params (currently a bit off)
-                JtJ[i][i] += (3.14/16) * l #random.normalvariate(10, 20) * 5000000000
-            else:
-                JtJ[i][i] += (1500 / 10) * l # TODO: Use intial focal estimate #random.normalvariate(10, 20) * 5000000000
-            # if
-        # for
-
-        b = J.T @ residuals
+    @telemetry.timed('solve')
+    def _get_next_update(self, system, damping, fixed, undamped=None):
+        '''
+        Solves the damped normal equations for the next update
 
-        updates = linalg.solve(JtJ, b)
+        Input:
+        ------
+        system  : normal equations
+        damping : vector added to the diagonal of JtJ
+        fixed   : mask of the params held fixed
+        undamped: optional undamped JtJ to reuse
+        '''
+        updates = system.solve(damping, fixed, undamped)
         
         return updates
     #
 
+    def _stratified_subset(self, pts):
+        '''
+        Picks at most max_points_per_match points spread over a grid
+        laid on the bounding box of the points (the overlap region).
+        The cells are visited round robin so every occupied cell
+        keeps a point before any cell keeps a second one
+
+        Input:
+        ------
+        pts: (N, 2) inlier points
+
+        Output:
+        -------
+        Returns the sorted indices of the kept points
+        '''
+        num_pts = len(pts)
+        if (self._max_points_per_match is None) or (num_pts <= self._max_points_per_match):
+            return arange(num_pts)
+        # if
+
+        grid     = int(ceil(sqrt(self._max_points_per_match)))
+        low      = pts.min(axis=0)
+        span     = maximum(pts.max(axis=0) - low, 1e-9)
+        cell     = minimum(((pts - low) / span * grid).astype(int), grid - 1)
+        cell_ids = cell[:, 1] * grid + cell[:, 0]
+
+        # Rank of each point inside its cell, in a random order
+        rng      = default_rng(BA_SAMPLING_SEED)
+        order    = rng.permutation(num_pts)
+        order    = order[argsort(cell_ids[order], kind='stable')]
+        cells    = cell_ids[order]
+        rank     = arange(num_pts) - searchsorted(cells, cells, side='left')
+
+        keep = order[lexsort((rng.random(num_pts), rank))[:self._max_points_per_match]]
+
+        return sort(keep)
+    #
+
     def add(self, match):
         '''
         Add a match to the bundle adjuster
         '''
-        num_pointwise_matches = sum(len(match.inliers) for match in self._matches)
-        self.match_count.append(num_pointwise_matches)
+        # Keep the inliers as contiguous (N, 2) arrays for the batched residuals
+        inliers  = asarray(match.inliers, dtype=float64).reshape(-1, 2, PARAMS_PER_POINT_MATCHES)
+        all_pts  = (ascontiguousarray(inliers[:, 0]), ascontiguousarray(inliers[:, 1]))
+        keep     = self._stratified_subset(all_pts[1])
+        self._all_pts.append(all_pts)
+        self._sampled_pts.append((all_pts[0][keep], all_pts[1][keep]))
 
         self._matches.append(match)
         for cam in match.cams():
             self._cameras.add(cam)
         # for
+        self._match_cams.append((self._cameras.index(match.cam_from), self._cameras.index(match.cam_to)))
 
-        print(f'Added match {match}')
+        telemetry.event('ba_add_match', cam_from=match.cam_from.image.filename, cam_to=match.cam_to.image.filename,
+                        inliers=len(all_pts[0]), sampled=len(self._sampled_pts[-1][0]))
     #
 
     def added_cameras(self):
@@ -27,18 +27,33 @@ ToDo:
 from camera      import Camera
 
 # OTHER IMPORTS
-from ordered_set import OrderedSet
-from numpy       import zeros, float64, copy, empty
-from utils       import PARAMS_PER_CAMERA
+from ordered_set             import OrderedSet
+from numpy                   import zeros, float64, empty, ascontiguousarray
+from scipy.spatial.transform import Rotation
+from utils                   import PARAMS_PER_CAMERA
 
 # USER INTERFACE
-idt = 1
 
 
 class state:
+    '''
+    Camera params held in one contiguous (C, 6) array
+    [focal, ppx, ppy, rx, ry, rz]. The rotation, K and K^-1 stacks
+    are built in one batch the first time they are needed and cached,
+    a state is never modified in place.
+    '''
+
     def __init__(self, params=empty(0, dtype=float64)):
-        self._params          = params
+        self._params          = ascontiguousarray(params, dtype=float64).reshape(-1)
         self.original_cameras = OrderedSet()
+        self._clear_cache()
+    #
+
+    def _clear_cache(self):
+        self._R       = None
+        self._K       = None
+        self._K_inv   = None
+        self._cameras = None
     #
     
     @property
@@ -46,6 +61,75 @@ class state:
         return self._params
     #
 
+    @property
+    def camera_params(self):
+        '''
+        (C, 6) view of the params
+        '''
+        return self._params.reshape(-1, PARAMS_PER_CAMERA)
+    #
+
+    @property
+    def num_cameras(self):
+        return len(self._params) // PARAMS_PER_CAMERA
+    #
+
+    @property
+    def rotvecs(self):
+        return self.camera_params[:, 3:6]
+    #
+
+    @property
+    def R(self):
+        '''
+        (C, 3, 3) rotation stack, batched Rodrigues conversion
+        '''
+        if self._R is None:
+            if self.num_cameras == 0:
+                self._R = empty((0, 3, 3), dtype=float64)
+            else:
+                self._R = Rotation.from_rotvec(self.rotvecs).as_matrix().reshape(-1, 3, 3)
+            # if
+        # if
+        return self._R
+    #
+
+    @property
+    def K(self):
+        '''
+        (C, 3, 3) intrinsic stack
+        '''
+        if self._K is None:
+            focal, ppx, ppy = self.camera_params[:, 0], self.camera_params[:, 1], self.camera_params[:, 2]
+
+            self._K          = zeros((self.num_cameras, 3, 3), dtype=float64)
+            self._K[:, 0, 0] = focal
+            self._K[:, 1, 1] = focal
+            self._K[:, 0, 2] = ppx
+            self._K[:, 1, 2] = ppy
+            self._K[:, 2, 2] = 1
+        # if
+        return self._K
+    #
+
+    @property
+    def K_inv(self):
+        '''
+        (C, 3, 3) closed form inverse of the intrinsic stack
+        '''
+        if self._K_inv is None:
+            focal, ppx, ppy = self.camera_params[:, 0], self.camera_params[:, 1], self.camera_params[:, 2]
+
+            self._K_inv          = zeros((self.num_cameras, 3, 3), dtype=float64)
+            self._K_inv[:, 0, 0] = 1 / focal
+            self._K_inv[:, 1, 1] = 1 / focal
+            self._K_inv[:, 0, 2] = -ppx / focal
+            self._K_inv[:, 1, 2] = -ppy / focal
+            self._K_inv[:, 2, 2] = 1
+        # if
+        return self._K_inv
+    #
+
     def set_initial_cameras(self, cameras):
         '''
         Get the initial cameras 
@@ -58,40 +142,40 @@ class state:
         '''
         Returns a new state object with the update applied
         '''
-        updatedParams = copy(self._params)
-        for i in range(len(self._params)):
-            if (i < idt * 6 + 3 or i >= idt * 6 + 6):
-                updatedParams[i] -= update[i]
-            # if
-        # for
-        
-        return state(updatedParams)
+        return state(self._params - update)
+    #
 
     def calculate_params(self, cameras):
-        self._params = zeros((PARAMS_PER_CAMERA * len(cameras)), dtype=float64)
-
-        for i in range(0, len(cameras) * PARAMS_PER_CAMERA, PARAMS_PER_CAMERA):
-            camera                = cameras[i//PARAMS_PER_CAMERA]
-            self._params[i]       = camera.focal
-            self._params[i+1]     = camera.ppx
-            self._params[i+2]     = camera.ppy
-            self._params[i+3:i+6] = camera.angle_parameterisation()
+        params = zeros((len(cameras), PARAMS_PER_CAMERA), dtype=float64)
+
+        for (cam_id, camera) in enumerate(cameras):
+            params[cam_id, 0]   = camera.focal
+            params[cam_id, 1]   = camera.ppx
+            params[cam_id, 2]   = camera.ppy
+            params[cam_id, 3:6] = camera.angle_parameterisation()
         # for
+
+        self._params = params.reshape(-1)
+        self._clear_cache()
     #
 
     @property
     def cameras(self):
-        cameras = []
-
-        for i in range(0, len(self._params), PARAMS_PER_CAMERA):
-            new_camera       = Camera(None)
-            new_camera.focal = self._params[i]
-            new_camera.ppx   = self._params[i+1]
-            new_camera.ppy   = self._params[i+2]
-            m                = new_camera.rotvec_to_matrix(self._params[i+3:i+6])
-            new_camera.R     = m
-            cameras.append(new_camera)
-        # for
-
-        return cameras
-    #
\ No newline at end of file
+        '''
+        Camera objects of the state, built once from the stacks
+        '''
+        if self._cameras is None:
+            self._cameras = []
+
+            for (cam_id, cam_params) in enumerate(self.camera_params):
+                new_camera       = Camera(None)
+                new_camera.focal = cam_params[0]
+                new_camera.ppx   = cam_params[1]
+                new_camera.ppy   = cam_params[2]
+                new_camera.R     = self.R[cam_id]
+                self._cameras.append(new_camera)
+            # for
+        # if
+
+        return self._cameras
+    #
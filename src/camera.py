@@ -32,28 +32,119 @@ import math
 from scipy.spatial.transform import Rotation
 
 class Camera:
+  '''
+  Intrinsic and extrinsic params of the camera of an image.
 
-  focal = 1
-  ppx = 0
-  ppy = 0
-  R = None
+  K, its closed form inverse and the composed K @ R and (K @ R)^-1 are
+  cached and rebuilt only after focal, ppx, ppy or R is set again.
+  The cached matrices are read-only, assign R again instead of
+  editing it in place.
+  '''
+
+  __slots__ = ('_image', '_focal', '_ppx', '_ppy', '_R', '_K', '_K_inv', '_KR', '_KR_inv')
 
   # Constructor
   def __init__(self, image):
     self._image = image
+    self._focal = 1
+    self._ppx   = 0
+    self._ppy   = 0
+    self._R     = None
+    self._clear_cache()
+
+  def _clear_cache(self):
+    self._K      = None
+    self._K_inv  = None
+    self._KR     = None
+    self._KR_inv = None
 
   @property
   def image(self):
     return self._image
 
+  @property
+  def focal(self):
+    return self._focal
+
+  @focal.setter
+  def focal(self, value):
+    self._focal = value
+    self._clear_cache()
+
+  @property
+  def ppx(self):
+    return self._ppx
+
+  @ppx.setter
+  def ppx(self, value):
+    self._ppx = value
+    self._clear_cache()
+
+  @property
+  def ppy(self):
+    return self._ppy
+
+  @ppy.setter
+  def ppy(self, value):
+    self._ppy = value
+    self._clear_cache()
+
+  @property
+  def R(self):
+    return self._R
+
+  @R.setter
+  def R(self, value):
+    self._R      = value
+    self._KR     = None
+    self._KR_inv = None
+
   @property
   def K(self):
-    I = np.identity(3, dtype=np.float64)
-    I[0][0] = self.focal
-    I[0][2] = self.ppx
-    I[1][1] = self.focal
-    I[1][2] = self.ppy
-    return I
+    if self._K is None:
+      I = np.identity(3, dtype=np.float64)
+      I[0][0] = self._focal
+      I[0][2] = self._ppx
+      I[1][1] = self._focal
+      I[1][2] = self._ppy
+      I.setflags(write=False)
+      self._K = I
+    return self._K
+
+  @property
+  def K_inv(self):
+    '''
+    K is upper triangular, its inverse has a closed form
+    '''
+    if self._K_inv is None:
+      I = np.identity(3, dtype=np.float64)
+      I[0][0] = 1 / self._focal
+      I[0][2] = -self._ppx / self._focal
+      I[1][1] = 1 / self._focal
+      I[1][2] = -self._ppy / self._focal
+      I.setflags(write=False)
+      self._K_inv = I
+    return self._K_inv
+
+  @property
+  def KR(self):
+    '''
+    K @ R, maps a ray to the image
+    '''
+    if self._KR is None:
+      self._KR = self.K @ self._R
+      self._KR.setflags(write=False)
+    return self._KR
+
+  @property
+  def KR_inv(self):
+    '''
+    (K @ R)^-1 = R^T @ K^-1, maps a pixel to a ray
+    '''
+    if self._KR_inv is None:
+      self._KR_inv = self._R.T @ self.K_inv
+      self._KR_inv.setflags(write=False)
+    return self._KR_inv
 
   def angle_parameterisation(self):
     u,s,v = np.linalg.svd(self.R)
@@ -23,31 +23,112 @@ ToDo:
 
 # CUSTOM IMPORTS
 from bundle_adjustment import bundle_adjustment
+from camera_store      import camera_store
+from focal_estimation  import focals_from_homographies, aggregate_focals
+import telemetry
 
 # OTHER IMPORTS
-from numpy    import median, identity, linalg
-import pickle as pckl
+from concurrent.futures import ThreadPoolExecutor
+from heapq              import heappush, heappop
+from itertools          import count
+from numpy              import median, identity, linalg
+from utils              import INCREMENTAL_BA, LOCAL_BA_MAX_ITR, FULL_BA_INTERVAL, BA_FINAL_POLISH, COMPONENT_WORKERS
+from utils              import PER_CAMERA_FOCAL, CAMERA_STORE_DIR
 
 # USER INTERFACE
 
 
+class disjoint_set:
+    '''
+    Union-find over the cameras, with path halving and union by size
+    '''
+
+    def __init__(self, items):
+        self._parent = {item: item for item in items}
+        self._size   = {item: 1 for item in items}
+    #
+
+    def find(self, item):
+        while self._parent[item] is not item:
+            self._parent[item] = self._parent[self._parent[item]]
+            item               = self._parent[item]
+        # while
+        return item
+    #
+
+    def union(self, item_a, item_b):
+        '''
+        Joins the sets of item_a and item_b
+
+        Output:
+        -------
+        Returns False if they were already in the same set
+        '''
+        root_a, root_b = self.find(item_a), self.find(item_b)
+        if root_a is root_b:
+            return False
+        # if
+
+        if self._size[root_a] < self._size[root_b]:
+            root_a, root_b = root_b, root_a
+        # if
+        self._parent[root_b]  = root_a
+        self._size[root_a]   += self._size[root_b]
+        return True
+    #
+
+
 class camera_estimator:
-    def __init__(self, matches):
-        self._matches = matches
+    def __init__(self, matches, store_dir=CAMERA_STORE_DIR):
+        '''
+        Input:
+        ------
+        matches  : matches of all the images
+        store_dir: directory of the camera checkpoints (see camera_store),
+                   None runs the bundle adjustment without checkpoints
+        '''
+        # Pairs where RANSAC found no homography carry no information
+        self._matches = [match for match in matches if (match.H is not None and len(match.inliers) > 0)]
+
+        # Checkpoints of the camera params, shared by the components
+        self._store = camera_store(store_dir) if store_dir is not None else None
 
         # Run the estmation
-        self._estimation()
+        self._components = self._estimation()
+    #
+
+    @property
+    def components(self):
+        '''
+        Cameras of each independent panorama, largest first
+        '''
+        return self._components
     #
 
     def _estimation(self):
         # Get the focal length
         self._get_focal_length()
-        use_order = self._span_trees()
+        add_orders = self._span_trees()
+
+        # do bundle, the components share no camera so they are adjusted in parallel
+        with ThreadPoolExecutor(max_workers=COMPONENT_WORKERS) as pool:
+            list(pool.map(self._use_bundle_adjustment, add_orders))
+        # with
 
-        # do bundle
-        self._use_bundle_adjustment(use_order)
+        # Once every component is saved, none prunes another's checkpoint
+        if self._store is not None:
+            self._store.prune()
+        # if
 
-        return self._all_cameras
+        return [self._component_cameras(add_order) for add_order in add_orders]
+    #
+
+    def _component_cameras(self, add_order):
+        cameras = set()
+        for match in add_order:
+            cameras.update(match.cams())
+        # for
+        return cameras
     #
 
 
@@ -70,65 +151,143 @@ class camera_estimator:
         match.H = match.H * (1.0/ match.H[2,2])
     #
 
+    def _reverse_match(self, match):
+        '''
+        Flips the direction of a match: cam_from and cam_to are swapped,
+        H is inverted and so are the points of each inlier pair
+        '''
+        match.cam_from, match.cam_to = match.cam_to, match.cam_from
+        match.H = linalg.inv(match.H)
+
+        for pair in match.inliers:
+            pair[0], pair[1] = pair[1], pair[0]
+        # for
+    #
+
     def _span_trees(self):
-        connected_nodes = set()
+        '''
+        Maximum spanning tree of the match graph over the inlier counts
+        (Kruskal with union-find). A disconnected graph gives one tree
+        per connected component
 
+        Output:
+        -------
+        Returns one add order per component, largest component first
+        '''
         # Get all the cameras of the images
         allCamers    = self._all_cameras()
         sorted_edges = sorted(self._matches, key=lambda m: len(m.inliers),
                               reverse=True)
-        
-        [print(f"{e.cam_from.image.filename},{e.cam_to.image.filename}: {len(e.inliers)}") for e in sorted_edges]
 
-        # Get the best edge to join the images
-        best_edge = sorted_edges.pop(0)
+        if telemetry.enabled():
+            telemetry.event('match_graph', edges=[(e.cam_from.image.filename, e.cam_to.image.filename, len(e.inliers))
+                                                  for e in sorted_edges])
+        # if
+        
+        # Keep the heaviest edges that join two different trees
+        components = disjoint_set(allCamers)
+        tree_edges = [edge for edge in sorted_edges if components.union(edge.cam_from, edge.cam_to)]
+
+        # Group the tree edges by component, still by decreasing inlier count
+        trees = {}
+        for edge in tree_edges:
+            trees.setdefault(components.find(edge.cam_from), []).append(edge)
+        # for
 
-        print(f'Best edge: {best_edge.cam_from.image.filename} - {best_edge.cam_to.image.filename}: {len(best_edge.inliers)}')
-        print(f'Best edge H: {best_edge.H}')
+        add_orders = [self._tree_order(edges) for edges in trees.values()]
+        add_orders.sort(key=len, reverse=True)
 
-        add_order = [best_edge]
-        connected_nodes.add(best_edge.cam_from)
-        connected_nodes.add(best_edge.cam_to)
+        for add_order in add_orders:
+            best_edge = add_order[0]
+            telemetry.event('best_edge', cam_from=best_edge.cam_from.image.filename, cam_to=best_edge.cam_to.image.filename,
+                            inliers=len(best_edge.inliers), H=best_edge.H, component_cameras=len(add_order) + 1)
+        # for
+            
+        return add_orders
+    #
 
-        while (len(connected_nodes) < len(allCamers)):
-            for (i, match) in enumerate(sorted_edges):
-                if (match.cam_from in connected_nodes):
-                    # Add node as is
-                    edge = sorted_edges.pop(i)
+    def _tree_order(self, edges):
+        '''
+        Orders the edges of a spanning tree for the incremental
+        estimation: it starts from the best edge and always grows the
+        tree with the heaviest edge touching it. An edge met from its
+        cam_to side is reversed so its cam_from is always placed first
+
+        Input:
+        ------
+        edges: tree edges sorted by decreasing inlier count
+        '''
+        adjacency = {}
+        for edge in edges:
+            for cam in edge.cams():
+                adjacency.setdefault(cam, []).append(edge)
+            # for
+        # for
 
-                    # Normalize the homography
-                    self._normalize_match_H(edge)
+        tie_break = count()
+        frontier  = []
+        added     = set()
+        add_order = []
 
-                    add_order.append(edge)
-                    connected_nodes.add(edge.cam_from)
-                    connected_nodes.add(edge.cam_to)
-                    break
+        def place(cam):
+            for edge in adjacency[cam]:
+                if edge not in added:
+                    heappush(frontier, (-len(edge.inliers), next(tie_break), cam, edge))
                 # if
             # for
+        #
+
+        place(edges[0].cam_from)
+        while frontier:
+            (_, _, placed_cam, edge) = heappop(frontier)
+            if edge in added:
+                continue
+            # if
+
+            if edge.cam_from is not placed_cam:
+                self._reverse_match(edge)
+            # if
+
+            # Normalize the homography
+            self._normalize_match_H(edge)
+
+            added.add(edge)
+            add_order.append(edge)
+            place(edge.cam_to)
         # while
-            
+
         return add_order
     #
 
     def _get_focal_length(self):
-        focal_length = []
-        for match in self._matches:
-            estimate_focal_length = match.estimate_focal_from_homography()
+        '''
+        Initial focal lengths from the focal candidates of all the
+        homographies at once, aggregated with an inlier weighted median.
+        With PER_CAMERA_FOCAL each camera gets the median of its own
+        candidates (mixed zoom sets)
+        '''
+        cameras = list(self._all_cameras())
+        cam_ids = {cam: cam_id for (cam_id, cam) in enumerate(cameras)}
 
-            if estimate_focal_length != 0:
-                focal_length.append(estimate_focal_length)
-                print(f"Estimate from {match.cam_from.image.filename} to {match.cam_to.image.filename}: {estimate_focal_length}",
-                      flush=True)
-            # if
-        # for
-        
-        # Get the median focal length of the images
-        median_focal_length = median(focal_length)
+        f0, f1, valid0, valid1 = focals_from_homographies([match.H for match in self._matches])
+
+        if telemetry.enabled():
+            for (match_id, match) in enumerate(self._matches):
+                telemetry.event('focal_estimate', cam_from=match.cam_from.image.filename, cam_to=match.cam_to.image.filename,
+                                f0=f0[match_id] if valid0[match_id] else None, f1=f1[match_id] if valid1[match_id] else None)
+            # for
+        # if
+
+        focal_lengths = aggregate_focals(f0, f1, valid0, valid1,
+                                         weights=[len(match.inliers) for match in self._matches],
+                                         from_ids=[cam_ids[match.cam_from] for match in self._matches],
+                                         to_ids=[cam_ids[match.cam_to] for match in self._matches],
+                                         num_cams=len(cameras), per_camera=PER_CAMERA_FOCAL)
 
-        print(f'Focal length is {median_focal_length}', flush=True)
+        print(f'Focal length is {median(focal_lengths)}', flush=True)
 
-        for camera in self._all_cameras():
-            camera.focal = median_focal_length
+        for (camera, focal_length) in zip(cameras, focal_lengths):
+            camera.focal = focal_length
         # for
     #
 
@@ -139,7 +298,10 @@ class camera_estimator:
 
         ba = bundle_adjustment()
 
-        other_matches = set(self._matches) - set(add_order)
+        # Only the matches inside this component
+        cameras           = self._component_cameras(add_order)
+        component_matches = [match for match in self._matches if (match.cam_from in cameras and match.cam_to in cameras)]
+        other_matches     = set(component_matches) - set(add_order)
 
         identity_cam   = add_order[0].cam_from
         identity_cam.R = identity(3)
@@ -147,21 +309,40 @@ class camera_estimator:
 
         print(f'Identity cam: {identity_cam.image.filename}')
 
-        print('Original match params:')
-        for match in add_order:
-            print(f'{match.cam_from.image.filename} to {match.cam_to.image.filename}:\n {match.cam_to.R}\n')
-            print('------------------')
-        # for
+        # Checkpoint of the same images and inliers from a previous run
+        key = self._store.key(component_matches) if self._store is not None else None
 
-        for match in add_order:
-            print(f'match.cam_from.R: {match.cam_from.R}')
-            print(f'match.cam_from.K: {match.cam_from.K}')
-            print(f'match.H: {match.H}')
-            print(f'match.cam_to.K: {match.cam_to.K}')
+        if (key is not None) and self._store.load(key, cameras):
+            print(f'Loaded cameras {key} from the store')
+        else:
+            self._add_matches(ba, add_order, other_matches)
 
-            match.cam_to.R = (match.cam_from.R.T @ (linalg.pinv(match.cam_from.K) @ match.H @ match.cam_to.K)).T
+            # Final global pass, warm started from the incremental solves
+            ba.run_ba()
+
+            if BA_FINAL_POLISH:
+                ba.run_ba(all_points=True)
+            # if
+            if key is not None:
+                self._store.save(key, cameras)
+            # if
+
+            print('BA complete.')
+        # if
+    #
+
+    def _add_matches(self, ba, add_order, other_matches):
+        '''
+        Adds each match to the bundle adjuster in the spanning tree 
+        order. In incremental mode a short local BA refines every new 
+        camera and its neighbours, with the other cameras held fixed, 
+        and a global BA runs every FULL_BA_INTERVAL cameras
+        '''
+        for (cam_count, match) in enumerate(add_order):
+            match.cam_to.R = (match.cam_from.R.T @ (match.cam_from.K_inv @ match.H @ match.cam_to.K)).T
             match.cam_to.ppx, match.cam_to.ppy = 0, 0
-            print(f'{match.cam_from.image.filename} to {match.cam_to.image.filename}:\n {match.cam_to.R}\n')
+            telemetry.event('camera_init', cam_from=match.cam_from.image.filename, cam_to=match.cam_to.image.filename,
+                            R=match.cam_to.R)
 
             ba.add(match)
 
@@ -174,38 +355,19 @@ class camera_estimator:
                 # if
             # for
 
-            for match in to_add:
-                # self._reverse_match(match)
-                ba.add(match)
-                other_matches.remove(match)
+            for other_match in to_add:
+                ba.add(other_match)
+                other_matches.remove(other_match)
             # for
-        # for
-            
-        all_cameras = None
-        try:
-            all_cameras = pckl.load(open(f'all_cameras_{len(self._all_cameras())}.p', 'rb'))
-
-            for match in self._matches:
-                for cam in all_cameras:
-                    if (match.cam_to.image.filename == cam.image.filename):
-                        match.cam_to = cam
-                    elif (match.cam_from.image.filename == cam.image.filename):
-                        match.cam_from = cam
-                    # if
-                # for
-            # for
-        except (OSError, IOError):    
-            ba.run_ba()
-            all_cameras = self._all_cameras()
-            # pckl.dump(all_cameras, open(f'all_cameras_{len(self.all_cameras())}.p', 'wb'))
 
-            print('BA complete.')
-        # try
-            
-
-
-
-
-    
+            if INCREMENTAL_BA:
+                new_cam = match.cam_to
+                if ((cam_count + 1) % FULL_BA_INTERVAL == 0):
+                    ba.run_ba()
+                else:
+                    ba.run_ba(free_cameras={new_cam} | ba.neighbours(new_cam), max_itr=LOCAL_BA_MAX_ITR)
+                # if
+            # if
+        # for
+    #
 
-    
\ No newline at end of file
@@ -0,0 +1,228 @@
+module_name = 'Camera Store'
+
+'''
+Version: v1.0.0
+
+Description:
+    Checkpoints of the estimated camera params. A set of cameras is
+    stored under a hash of its images and of the inliers of its
+    matches, so a rerun on the same images and matches skips the
+    bundle adjustment, while any other shoot gets a different key.
+
+    Each checkpoint is an npz of plain arrays:
+
+        filenames: image filename of each camera
+        focal    : (C,)
+        ppx, ppy : (C,)
+        rotvecs  : (C, 3) rotation vectors
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    <***>
+
+Notes:
+    The key ignores the direction of the matches, a match and its
+    reverse hash the same. The inliers only repeat across runs because
+    RANSAC is seeded (RANSAC_SEED).
+
+    Only the CAMERA_STORE_MAX_ENTRIES most recently saved or loaded
+    checkpoints are kept, prune() removes the others. The components
+    are adjusted on several threads, loads, saves and prunes hold a
+    module lock, and a checkpoint removed by another process reads as
+    missing.
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+
+# OTHER IMPORTS
+from hashlib import sha1
+from numpy   import asarray, ascontiguousarray, array, float64, load, savez
+from glob    import glob
+from os        import makedirs, path, remove, replace, utime
+from threading import Lock
+from utils     import CAMERA_STORE_DIR, CAMERA_STORE_MAX_ENTRIES
+
+# USER INTERFACE
+STORE_VERSION = b'camera_store v1'
+
+_lock = Lock()
+
+
+class camera_store:
+    def __init__(self, directory=CAMERA_STORE_DIR, max_entries=CAMERA_STORE_MAX_ENTRIES):
+        '''
+        Input:
+        ------
+        directory  : directory of the checkpoints
+        max_entries: checkpoints kept, the least recently used go first.
+                     None keeps them all
+        '''
+        self._directory   = directory
+        self._max_entries = max_entries
+    #
+
+    def key(self, matches):
+        '''
+        Hash of the images of the cameras and of the match inliers
+
+        Input:
+        ------
+        matches: matches of one set of cameras
+
+        Output:
+        -------
+        Returns the hex digest
+        '''
+        digest  = sha1(STORE_VERSION)
+        cameras = {cam for match in matches for cam in match.cams()}
+
+        for cam in sorted(cameras, key=lambda cam: cam.image.filename):
+            digest.update(cam.image.filename.encode())
+            digest.update(ascontiguousarray(cam.image.image).tobytes())
+        # for
+
+        # Each match in a canonical direction, ordered by image names
+        canonical = []
+        for match in matches:
+            names = (match.cam_from.image.filename, match.cam_to.image.filename)
+            pts   = asarray(match.inliers, dtype=float64).reshape(-1, 2, 2)
+            if names[0] > names[1]:
+                names, pts = names[::-1], pts[:, ::-1]
+            # if
+            canonical.append((names, pts))
+        # for
+
+        for (names, pts) in sorted(canonical, key=lambda entry: entry[0]):
+            digest.update('|'.join(names).encode())
+            digest.update(ascontiguousarray(pts).tobytes())
+        # for
+        return digest.hexdigest()
+    #
+
+    def _path(self, key):
+        return path.join(self._directory, f'cameras_{key}.npz')
+    #
+
+    def filenames(self, key):
+        '''
+        Image filenames of the cameras of the checkpoint of key, in the
+        stored order
+
+        Output:
+        -------
+        Returns the list of filenames, None if there is no checkpoint
+        '''
+        with _lock:
+            try:
+                checkpoint = load(self._path(key))
+            except FileNotFoundError:
+                return None
+            # try
+
+            with checkpoint:
+                return [str(name) for name in checkpoint['filenames']]
+            # with
+        # with
+    #
+
+    def load(self, key, cameras):
+        '''
+        Sets the params of the cameras from the checkpoint of key
+
+        Output:
+        -------
+        Returns False, leaving the cameras untouched, if there is no
+        checkpoint for key or it holds other images
+        '''
+        with _lock:
+            try:
+                checkpoint = load(self._path(key))
+            except FileNotFoundError:
+                return False
+            # try
+
+            with checkpoint:
+                by_name = {cam.image.filename: cam for cam in cameras}
+                names   = [str(name) for name in checkpoint['filenames']]
+
+                if sorted(names) != sorted(by_name):
+                    return False
+                # if
+
+                for (cam_id, name) in enumerate(names):
+                    cam       = by_name[name]
+                    cam.focal = float(checkpoint['focal'][cam_id])
+                    cam.ppx   = float(checkpoint['ppx'][cam_id])
+                    cam.ppy   = float(checkpoint['ppy'][cam_id])
+                    cam.R     = cam.rotvec_to_matrix(checkpoint['rotvecs'][cam_id])
+                # for
+            # with
+
+            # Used, kept the longest by prune
+            try:
+                utime(self._path(key))
+            except FileNotFoundError:
+                pass
+            # try
+        # with
+        return True
+    #
+
+    def prune(self):
+        '''
+        Removes all but the max_entries most recently used checkpoints,
+        called once all the components are adjusted
+        '''
+        if self._max_entries is None:
+            return
+        # if
+
+        with _lock:
+            checkpoints = []
+            for checkpoint in glob(path.join(self._directory, 'cameras_*.npz')):
+                try:
+                    checkpoints.append((path.getmtime(checkpoint), checkpoint))
+                except FileNotFoundError:
+                    continue
+                # try
+            # for
+
+            for (_, stale) in sorted(checkpoints, reverse=True)[self._max_entries:]:
+                try:
+                    remove(stale)
+                except FileNotFoundError:
+                    pass
+                # try
+            # for
+        # with
+    #
+
+    def save(self, key, cameras):
+        '''
+        Writes the params of the cameras under key. The file is written
+        next to its final name and renamed, a crash never leaves a
+        partial checkpoint
+        '''
+        cameras = sorted(cameras, key=lambda cam: cam.image.filename)
+
+        with _lock:
+            makedirs(self._directory, exist_ok=True)
+            temp_path = self._path(key) + '.tmp'
+            with open(temp_path, 'wb') as checkpoint:
+                savez(checkpoint,
+                      filenames=array([cam.image.filename for cam in cameras]),
+                      focal=array([cam.focal for cam in cameras], dtype=float64),
+                      ppx=array([cam.ppx for cam in cameras], dtype=float64),
+                      ppy=array([cam.ppy for cam in cameras], dtype=float64),
+                      rotvecs=array([cam.angle_parameterisation() for cam in cameras], dtype=float64).reshape(-1, 3))
+            # with
+            replace(temp_path, self._path(key))
+        # with
+    #
@@ -23,9 +23,10 @@ ToDo:
 '''
 
 # OTHER IMPORTS
+import kernels
 
 # CUSTOM IMPORTS
-from numpy import array, nan, empty, mean, sum, power, sqrt, vstack, ones, linalg, asarray
+from numpy import array, nan, empty, mean, sum, power, sqrt, vstack, ones, linalg
 
 
 def compute_A_matrix(pt1, pt2):
@@ -43,17 +44,9 @@ def compute_A_matrix(pt1, pt2):
     A: 2n x 9 matrix 
     """
 
-    A = []
-
-    for i in range (0, len(pt1)):
-        x, y             = pt1[i]
-        x_prime, y_prime = pt2[i]
-
-        A.append([0, 0, 0, -x, -y, -1, y_prime * x, y_prime * y, y_prime])
-        A.append([x, y, 1, 0, 0, 0, -x_prime * x, -x_prime * y, -x_prime])
-    # for
+    A = kernels.compute_A_matrix(pt1, pt2)
     
-    return asarray(A)
+    return A
 #
 
 def normalize_point(pts):
@@ -72,7 +65,7 @@ def normalize_point(pts):
     x_mean, y_mean = mean(pts, axis=0)
 
     # sum of distance between the mean and points
-    total_dist = sum(power((power((pt[0]-x_mean),2)+power((pt[1]-y_mean),2)),0.5) for pt in pts)
+    total_dist = sum(power((power((pts[:,0]-x_mean),2)+power((pts[:,1]-y_mean),2)),0.5))
 
     # average the distance
     avg_dist = total_dist / len(pts)
@@ -0,0 +1,150 @@
+module_name = 'Focal Estimation'
+
+'''
+Version: v1.0.0
+
+Description:
+    Focal length candidates from a stack of homographies, computed
+    for all the matches at once, and their robust aggregation.
+
+    For H = K_to R K_from^-1 the orthogonality of the columns of R
+    gives the focal of cam_to (f1) and of its rows the focal of
+    cam_from (f0).
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    Szeliski, Shum: Creating full view panoramic image mosaics and
+    environment maps (1997)
+
+Notes:
+    Same candidates as the scalar Match.estimate_focal_from_homography,
+    which now calls this module with a stack of one.
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+
+# OTHER IMPORTS
+from numpy import asarray, float64, where, sqrt, abs, isfinite, errstate, argsort, cumsum, searchsorted, zeros
+
+# USER INTERFACE
+
+
+def _pick_candidate(d1, d2, v1, v2):
+    '''
+    Chooses between the two candidates of f^2 like the scalar
+    version: the larger one when only it is positive, the one of the
+    better conditioned equation when both are
+    '''
+    swap   = v1 < v2
+    v_high = where(swap, v2, v1)
+    v_low  = where(swap, v1, v2)
+
+    both   = (v_high > 0) & (v_low > 0)
+    focal  = where(both & (abs(d1) <= abs(d2)), v_low, v_high)
+    valid  = v_high > 0
+
+    focal  = sqrt(where(valid, focal, 1.0))
+    valid &= isfinite(focal)
+    return where(valid, focal, 0.0), valid
+#
+
+
+def focals_from_homographies(Hs):
+    '''
+    Focal candidates of every homography
+
+    Input:
+    ------
+    Hs: (M, 3, 3) homographies mapping cam_from onto cam_to
+
+    Output:
+    -------
+    Returns f0 (cam_from), f1 (cam_to) and their validity masks, all (M,).
+    An invalid candidate is 0
+    '''
+    h = asarray(Hs, dtype=float64).reshape(-1, 3, 3)
+
+    with errstate(divide='ignore', invalid='ignore', over='ignore'):
+        d1 = h[:, 2, 0] * h[:, 2, 1]
+        d2 = (h[:, 2, 1] - h[:, 2, 0]) * (h[:, 2, 1] + h[:, 2, 0])
+        v1 = -(h[:, 0, 0] * h[:, 0, 1] + h[:, 1, 0] * h[:, 1, 1]) / d1
+        v2 = (h[:, 0, 0]**2 + h[:, 1, 0]**2 - h[:, 0, 1]**2 - h[:, 1, 1]**2) / d2
+        f1, valid1 = _pick_candidate(d1, d2, v1, v2)
+
+        d1 = h[:, 0, 0] * h[:, 1, 0] + h[:, 0, 1] * h[:, 1, 1]
+        d2 = h[:, 0, 0]**2 + h[:, 0, 1]**2 - h[:, 1, 0]**2 - h[:, 1, 1]**2
+        v1 = -h[:, 0, 2] * h[:, 1, 2] / d1
+        v2 = (h[:, 1, 2]**2 - h[:, 0, 2]**2) / d2
+        f0, valid0 = _pick_candidate(d1, d2, v1, v2)
+    # with
+
+    return f0, f1, valid0, valid1
+#
+
+
+def weighted_median(values, weights):
+    '''
+    Value splitting the total weight in half
+
+    Input:
+    ------
+    values : (N,) values
+    weights: (N,) non negative weights, at least one positive
+    '''
+    values  = asarray(values, dtype=float64)
+    order   = argsort(values)
+    cum_wts = cumsum(asarray(weights, dtype=float64)[order])
+
+    return values[order][searchsorted(cum_wts, 0.5 * cum_wts[-1])]
+#
+
+
+def aggregate_focals(f0, f1, valid0, valid1, weights, from_ids, to_ids, num_cams, per_camera=False):
+    '''
+    Inlier weighted median of the focal candidates
+
+    Input:
+    ------
+    f0, f1, valid0, valid1: output of focals_from_homographies
+    weights               : (M,) weight of each match, its inlier count
+    from_ids, to_ids      : (M,) camera index of cam_from and cam_to of each match
+    num_cams              : number of cameras
+    per_camera            : one focal per camera from its own candidates,
+                            cameras without candidates get the shared one
+
+    Output:
+    -------
+    Returns (num_cams,) focal lengths
+    '''
+    weights = asarray(weights, dtype=float64)
+    focals  = list(f0[valid0]) + list(f1[valid1])
+    cam_ids = list(asarray(from_ids)[valid0]) + list(asarray(to_ids)[valid1])
+    focal_w = list(weights[valid0]) + list(weights[valid1])
+
+    if len(focals) == 0:
+        raise ValueError('No valid focal length estimate from the homographies')
+    # if
+
+    shared = weighted_median(focals, focal_w)
+    result = zeros((num_cams), dtype=float64) + shared
+
+    if per_camera:
+        cam_ids = asarray(cam_ids)
+        focals  = asarray(focals)
+        focal_w = asarray(focal_w)
+        for cam_id in range(num_cams):
+            mask = cam_ids == cam_id
+            if mask.any():
+                result[cam_id] = weighted_median(focals[mask], focal_w[mask])
+            # if
+        # for
+    # if
+    return result
+#
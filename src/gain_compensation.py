@@ -0,0 +1,205 @@
+module_name = 'Gain Compensation'
+
+'''
+Version: v1.0.0
+
+Description:
+    Exposure compensation of the warped images, estimated on a
+    downscaled copy of the canvas (SEAM_MEGAPIX per image) and
+    upsampled by Stitch.
+
+        block_gain_compensator: one gain per image, then every image
+                                is cut in blocks of GAIN_BLOCK_SIZE
+                                pixels, each block gets a gain so that
+                                overlapping blocks match in mean
+                                intensity, the gains staying close to 1
+
+    For the overlap of blocks i and j, N_ij pixels of mean intensities
+    I_ij (in i) and I_ji (in j), the gains minimise
+
+        sum N_ij ((g_i I_ij - g_j I_ji)^2 / sigma_n^2 + (1 - g_i)^2 / sigma_g^2)
+
+    a sparse linear system with one unknown per block (or per image,
+    each image taken as one block).
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    Brown, Lowe: Automatic panoramic image stitching using invariant
+    features (2007), 6
+
+Notes:
+    The gains of each image are smoothed over the neighbouring blocks
+    before being resized to the image, blocks do not show.
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+
+# OTHER IMPORTS
+import cv2          as cv
+import numpy        as np
+from scipy.sparse        import coo_matrix, identity
+from scipy.sparse.linalg import spsolve
+from utils               import GAIN_COMPENSATION, GAIN_BLOCK_SIZE
+
+# USER INTERFACE
+GAIN_SIGMA_N = 10.0
+GAIN_SIGMA_G = 0.1
+
+
+class block_gain_compensator:
+
+    def __init__(self, block_size=GAIN_BLOCK_SIZE):
+        self._block_size = block_size
+    #
+
+    def _block_ids(self, shape, offset):
+        '''
+        Block index of every pixel of an image, numbered from offset
+        '''
+        h, w   = shape[:2]
+        blocks = -(-w // self._block_size)
+
+        rows = np.arange(h)[:, None] // self._block_size
+        cols = np.arange(w)[None, :] // self._block_size
+        return offset + rows * blocks + cols
+    #
+
+    def _solve(self, parts, intensities, block_ids, num_blocks):
+        '''
+        Gains of the blocks
+
+        Input:
+        ------
+        parts      : list of (rect, image, mask) in the downscaled canvas
+        intensities: intensity image of each part
+        block_ids  : block index of every pixel of each part
+        num_blocks : total number of blocks
+
+        Output:
+        -------
+        Returns the (num_blocks,) gains
+        '''
+        rows, cols, vals = [], [], []
+        rhs = np.zeros((num_blocks), dtype=np.float64)
+
+        for i in range(len(parts)):
+            for j in range(i + 1, len(parts)):
+                (ri, _, mask_i), (rj, _, mask_j) = parts[i], parts[j]
+                (x0, y0) = (max(ri[0], rj[0]), max(ri[1], rj[1]))
+                (x1, y1) = (min(ri[2], rj[2]), min(ri[3], rj[3]))
+                if (x0 >= x1 or y0 >= y1):
+                    continue
+                # if
+
+                in_i = (slice(y0 - ri[1], y1 - ri[1]), slice(x0 - ri[0], x1 - ri[0]))
+                in_j = (slice(y0 - rj[1], y1 - rj[1]), slice(x0 - rj[0], x1 - rj[0]))
+                both = mask_i[in_i] & mask_j[in_j]
+                if not both.any():
+                    continue
+                # if
+
+                # Pixel count and mean intensities of each pair of overlapping blocks
+                pairs, inverse = np.unique(block_ids[i][in_i][both].astype(np.int64) * num_blocks
+                                           + block_ids[j][in_j][both], return_inverse=True)
+                count  = np.bincount(inverse).astype(np.float64)
+                mean_i = np.bincount(inverse, weights=intensities[i][in_i][both]) / count
+                mean_j = np.bincount(inverse, weights=intensities[j][in_j][both]) / count
+                (bi, bj) = (pairs // num_blocks, pairs % num_blocks)
+
+                rows += [bi, bj, bi, bj]
+                cols += [bi, bj, bj, bi]
+                vals += [count * (mean_i**2 / GAIN_SIGMA_N**2 + 1 / GAIN_SIGMA_G**2),
+                         count * (mean_j**2 / GAIN_SIGMA_N**2 + 1 / GAIN_SIGMA_G**2),
+                         -count * mean_i * mean_j / GAIN_SIGMA_N**2,
+                         -count * mean_i * mean_j / GAIN_SIGMA_N**2]
+                np.add.at(rhs, bi, count / GAIN_SIGMA_G**2)
+                np.add.at(rhs, bj, count / GAIN_SIGMA_G**2)
+            # for
+        # for
+
+        # Unit weight prior, keeps the blocks without overlap at 1
+        A = identity(num_blocks, format='csr')
+        if rows:
+            A = A + coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                               shape=(num_blocks, num_blocks)).tocsr()
+        # if
+        return np.atleast_1d(spsolve(A, rhs + 1.0))
+    #
+
+    def gains(self, parts):
+        '''
+        One gain per image first, then per block on the compensated
+        images for what is left, e.g. vignetting
+
+        Input:
+        ------
+        parts: list of (rect, image, mask) in the downscaled canvas,
+               the masks boolean
+
+        Output:
+        -------
+        Returns the (H, W) float32 gain map of each part
+        '''
+        intensities = [image.astype(np.float32).mean(axis=2) for (_, image, _) in parts]
+
+        image_ids   = [np.full(image.shape[:2], part_id) for (part_id, (_, image, _)) in enumerate(parts)]
+        image_gains = self._solve(parts, intensities, image_ids, len(parts))
+        intensities = [intensity * gain for (intensity, gain) in zip(intensities, image_gains)]
+
+        grids      = []
+        block_ids  = []
+        num_blocks = 0
+        for (_, image, _) in parts:
+            h, w = image.shape[:2]
+            grids.append((-(-h // self._block_size), -(-w // self._block_size)))
+            block_ids.append(self._block_ids(image.shape, num_blocks))
+            num_blocks += grids[-1][0] * grids[-1][1]
+        # for
+        block_gains = self._solve(parts, intensities, block_ids, num_blocks)
+
+        # Smoothed over the neighbouring blocks and resized to each image
+        kernel = np.float32([0.25, 0.5, 0.25])
+        result = []
+        offset = 0
+        for ((_, image, _), (grid_h, grid_w), image_gain) in zip(parts, grids, image_gains):
+            grid    = block_gains[offset:offset + grid_h * grid_w].reshape(grid_h, grid_w).astype(np.float32)
+            offset += grid_h * grid_w
+
+            for _ in range(2):
+                grid = cv.sepFilter2D(grid, -1, kernel, kernel, borderType=cv.BORDER_REFLECT)
+            # for
+            result.append(np.float32(image_gain) * cv.resize(grid, image.shape[1::-1], interpolation=cv.INTER_LINEAR))
+        # for
+        return result
+    #
+
+
+GAIN_COMPENSATORS = {'blocks': block_gain_compensator}
+
+
+def make_gain_compensator(mode=GAIN_COMPENSATION):
+    '''
+    Input:
+    ------
+    mode: 'blocks', or None for no gain compensation
+
+    Output:
+    -------
+    Returns the gain compensator, None when mode is None
+    '''
+    if mode is None:
+        return None
+    # if
+
+    if mode not in GAIN_COMPENSATORS:
+        raise ValueError(f'Unknown gain compensation {mode}, expected one of {sorted(GAIN_COMPENSATORS)}')
+    # if
+    return GAIN_COMPENSATORS[mode]()
+#
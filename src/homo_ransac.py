@@ -24,9 +24,12 @@ ToDo:
 
 # OTHER IMPORTS
 from dlt import use_dlt
+from kernels import projected_errors
+from utils import RANSAC_SEED
+import telemetry
 
 # CUSTOM IMPORTS
-from numpy import random, hstack, ones, power, std, argmin, array
+from numpy import random, hstack, ones, power, std, argmin, array, flatnonzero
 
 
 
@@ -56,21 +59,27 @@ def projected_error(pt1, pt2, H):
 #
 
 
-def use_ransac(pts1, pts2, max_iterations, threshold):
+def use_ransac(pts1, pts2, max_iterations, threshold, pair=None):
     """
     Finds the best guess for the homography to map 
     pts3 onto the plane of pts1
+
+    pair: optional names of the two images, reported with the telemetry
+
+    The samples come from a generator seeded with RANSAC_SEED, a rerun
+    on the same points finds the same inliers
     """
 
     bestinliers = []
     best_h      = None
     listH       = []
     stdListH    = []
+    rng         = random.default_rng(RANSAC_SEED)
 
     # Loop through the number of iterations
     for i_iter in range(max_iterations):
         # random points
-        idx_pts = random.choice(len(pts1),4)
+        idx_pts = rng.choice(len(pts1),4)
 
         # Get the samples using the random generated pts
         sample_pts1 = pts1[idx_pts]
@@ -79,21 +88,14 @@ def use_ransac(pts1, pts2, max_iterations, threshold):
         # Compute H using DLT
         H = use_dlt(sample_pts1, sample_pts2)
 
-        # Get the right points
-        inliers = []
+        # Distance for every correspondence point at once
+        dist = projected_errors(pts1, pts2, H)
 
-        for i_pt in range(len(pts1)):
-            # Distance for each correspondence point
-            dist = projected_error(pts1[i_pt],pts2[i_pt],H)
+        # Add a thrshold
+        idx_inliers = flatnonzero(dist < threshold)
 
-            # Add a thrshold
-            if (dist < threshold):
-                inliers.append([pts1[i_pt],pts2[i_pt]])
-            # if
-        # for
-
-        if (len(inliers) > len(bestinliers)):
-            bestinliers = inliers
+        if (len(idx_inliers) > len(bestinliers)):
+            bestinliers = [[pts1[i_pt],pts2[i_pt]] for i_pt in idx_inliers]
             best_h      = H
 
         # elif (len(inliers) and len(bestinliers)) == []:
@@ -111,6 +113,9 @@ def use_ransac(pts1, pts2, max_iterations, threshold):
         # if
     # for
 
+    telemetry.event('ransac', pair=pair, iterations=max_iterations, points=len(pts1), inliers=len(bestinliers),
+                    inlier_ratio=len(bestinliers) / max(len(pts1), 1))
+
     return best_h, bestinliers
 
 
@@ -0,0 +1,210 @@
+module_name = 'Kernels'
+
+'''
+Version: v1.0.0
+
+Description:
+    Per-point kernels of the RANSAC scoring, the DLT and the bundle
+    adjustment derivatives. Each kernel has a pure NumPy version and,
+    when Numba is installed, a JIT-compiled loop version. The public
+    functions use the compiled one when it is available and USE_NUMBA
+    is set, the NumPy one otherwise.
+
+    tests/test_kernels.py checks that every path gives the same
+    results as the scalar reference, the Numba one skipped when Numba
+    is not installed.
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    https://numba.readthedocs.io/en/stable/user/jit.html
+
+Notes:
+    Numba is optional, nothing else in the project needs it.
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+
+# OTHER IMPORTS
+from numpy import zeros, empty, ones, hstack, ascontiguousarray, float64
+from utils import USE_NUMBA
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+# try
+
+# USER INTERFACE
+
+
+def _projected_errors_numpy(pts1, pts2, H):
+    proj = pts1 @ H[:, :2].T + H[:, 2]
+    diff = hstack([pts2, ones((len(pts2), 1))]) - proj
+    return (diff**2).sum(axis=1)
+#
+
+
+def _compute_A_matrix_numpy(pt1, pt2):
+    x, y             = pt1[:, 0], pt1[:, 1]
+    x_prime, y_prime = pt2[:, 0], pt2[:, 1]
+
+    A = zeros((2 * len(pt1), 9), dtype=float64)
+    A[0::2, 3] = -x
+    A[0::2, 4] = -y
+    A[0::2, 5] = -1
+    A[0::2, 6] = y_prime * x
+    A[0::2, 7] = y_prime * y
+    A[0::2, 8] = y_prime
+    A[1::2, 0] = x
+    A[1::2, 1] = y
+    A[1::2, 2] = 1
+    A[1::2, 6] = -x_prime * x
+    A[1::2, 7] = -x_prime * y
+    A[1::2, 8] = -x_prime
+    return A
+#
+
+
+def _dH_homo_coord_numpy(dhdv, homo):
+    hz_inv = 1.0 / homo[:, 2:3]
+    coord  = homo[:, :2] * hz_inv
+    return (dhdv[:, :, 2:3] * coord - dhdv[:, :, :2]) * hz_inv
+#
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _projected_errors_numba(pts1, pts2, H):
+        errors = empty(pts1.shape[0])
+        for i in range(pts1.shape[0]):
+            x, y = pts1[i, 0], pts1[i, 1]
+            hx   = H[0, 0] * x + H[0, 1] * y + H[0, 2]
+            hy   = H[1, 0] * x + H[1, 1] * y + H[1, 2]
+            hz   = H[2, 0] * x + H[2, 1] * y + H[2, 2]
+
+            errors[i] = (pts2[i, 0] - hx)**2 + (pts2[i, 1] - hy)**2 + (1.0 - hz)**2
+        # for
+        return errors
+    #
+
+    @njit(cache=True)
+    def _compute_A_matrix_numba(pt1, pt2):
+        A = zeros((2 * pt1.shape[0], 9))
+        for i in range(pt1.shape[0]):
+            x, y             = pt1[i, 0], pt1[i, 1]
+            x_prime, y_prime = pt2[i, 0], pt2[i, 1]
+
+            A[2*i, 3]   = -x
+            A[2*i, 4]   = -y
+            A[2*i, 5]   = -1.0
+            A[2*i, 6]   = y_prime * x
+            A[2*i, 7]   = y_prime * y
+            A[2*i, 8]   = y_prime
+            A[2*i+1, 0] = x
+            A[2*i+1, 1] = y
+            A[2*i+1, 2] = 1.0
+            A[2*i+1, 6] = -x_prime * x
+            A[2*i+1, 7] = -x_prime * y
+            A[2*i+1, 8] = -x_prime
+        # for
+        return A
+    #
+
+    @njit(cache=True)
+    def _dH_homo_coord_numba(dhdv, homo):
+        dE = empty((dhdv.shape[0], dhdv.shape[1], 2))
+        for n in range(homo.shape[0]):
+            hz_inv = 1.0 / homo[n, 2]
+            u      = homo[n, 0] * hz_inv
+            v      = homo[n, 1] * hz_inv
+            for p in range(dhdv.shape[0]):
+                dE[p, n, 0] = (dhdv[p, n, 2] * u - dhdv[p, n, 0]) * hz_inv
+                dE[p, n, 1] = (dhdv[p, n, 2] * v - dhdv[p, n, 1]) * hz_inv
+            # for
+        # for
+        return dE
+    #
+# if
+
+
+def _use_numba():
+    return NUMBA_AVAILABLE and USE_NUMBA
+#
+
+
+def projected_errors(pts1, pts2, H):
+    '''
+    Squared projection error of every correspondence, H @ [pt1, 1]
+    compared with [pt2, 1] without dehomogenising (as in
+    homo_ransac.projected_error)
+
+    Input:
+    ------
+    pts1, pts2: (N, 2) corresponding points
+    H         : homography
+
+    Output:
+    -------
+    Returns (N,) errors
+    '''
+    pts1 = ascontiguousarray(pts1, dtype=float64)
+    pts2 = ascontiguousarray(pts2, dtype=float64)
+    H    = ascontiguousarray(H, dtype=float64)
+
+    if _use_numba():
+        return _projected_errors_numba(pts1, pts2, H)
+    # if
+    return _projected_errors_numpy(pts1, pts2, H)
+#
+
+
+def compute_A_matrix(pt1, pt2):
+    '''
+    2n X 9 DLT matrix of the correspondences
+
+    Input:
+    ------
+    pt1, pt2: (N, 2) corresponding points
+
+    Output:
+    -------
+    A: 2n x 9 matrix
+    '''
+    pt1 = ascontiguousarray(pt1, dtype=float64)
+    pt2 = ascontiguousarray(pt2, dtype=float64)
+
+    if _use_numba():
+        return _compute_A_matrix_numba(pt1, pt2)
+    # if
+    return _compute_A_matrix_numpy(pt1, pt2)
+#
+
+
+def dH_homo_coord(dhdv, homo):
+    '''
+    Derivatives of the reprojection error from the derivatives of
+    the homogenous coordinates
+
+    Input:
+    ------
+    dhdv: (P, N, 3) derivatives of [hx, hy, hz] w.r.t each of the P params
+    homo: (N, 3) homogenous points
+
+    Output:
+    -------
+    Returns (P, N, 2) derivatives
+    '''
+    if _use_numba():
+        return _dH_homo_coord_numba(ascontiguousarray(dhdv, dtype=float64), ascontiguousarray(homo, dtype=float64))
+    # if
+    return _dH_homo_coord_numpy(dhdv, homo)
+#
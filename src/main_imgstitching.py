@@ -6,6 +6,16 @@ Version: v1.0.0
 Description:
     Master module
 
+    python main_imgstitching.py [images] [--preview] [--render] [--job-dir DIR]
+
+        (no flag): estimates the cameras and stitches at full resolution
+        --preview: estimates the cameras, saves them as a render job and
+                   composes at PREVIEW_MEGAPIX per image with K rescaled.
+                   Pressing y on the preview starts the full render
+        --render : full resolution render of the saved job, tiled on a
+                   canvas file in the job directory. An interrupted
+                   render resumes from its finished tiles
+
 Authors:
     Iphy Kelvin
 
@@ -24,14 +34,26 @@ ToDo:
 
 
 # CUSTOM IMPORTS
+from camera           import Camera
 from camera_estimator import camera_estimator as cam_est
+from camera_store     import camera_store
 from getKeyDescptr    import sift_descriptor as sift_desc
 from matcher          import Matcher
+from output_writers   import make_output_writer
 from stitch_image     import Stitch
+import telemetry
 
 # OTHER IMPORTS
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import json
+import math
 import os
 import cv2 as cv
+from utils import TELEMETRY_PATH, COMPONENT_WORKERS, PREVIEW_MEGAPIX, RENDER_JOB_DIR, RENDER_TILE_SIZE, STITCH_TILE_SIZE
+from utils import OUTPUT_FORMAT, CAMERA_STORE_DIR
+
+IMAGES_DIR = "C:/Users/Starboy/OneDrive/RIT/Courses/IPCV/Assignments/HW4/Images"
 
 
 def read_files_dir(dir):
@@ -50,10 +72,20 @@ def read_files_dir(dir):
     return imgs
 
 
-def main():
-    
+def stitch_component(cameras, writer=None):
+
+    # Stitch the images of one panorama, streamed to the writer if any
+    stitch = Stitch(cameras, writer=writer)
+    stitch.run()
+
+    # Owns the canvas, closed once the image is no longer needed
+    return stitch
+
+
+def estimate_cameras(images_dir, store_dir=CAMERA_STORE_DIR):
+
     # Read the images
-    see_imgs = read_files_dir("C:/Users/Starboy/OneDrive/RIT/Courses/IPCV/Assignments/HW4/Images")
+    see_imgs = read_files_dir(images_dir)
 
     # Get the keypoints and descriptors
     for img in see_imgs:
@@ -64,17 +96,162 @@ def main():
     matches          = Matcher(see_imgs)
     getKeypt_matches = matches.run_matcher()
 
-    # Get camera estimates
-    cameraEsts = cam_est(getKeypt_matches)
-    estimated_cams = cameraEsts._estimation()
+    # Get camera estimates, one set of cameras per independent panorama,
+    # checkpointed in store_dir unless it is None
+    cameraEsts = cam_est(getKeypt_matches, store_dir)
 
-    # Stitch the images
-    stitch = Stitch(estimated_cams)
-    stitch.run()
+    return [list(cameras) for cameras in cameraEsts.components]
+
+
+def scaled_cameras(cameras, scale):
+    '''
+    Copies of the cameras on their images resized by scale, K rescaled
+    to match and R shared
+    '''
+    scaled = []
+    for (img_id, cam) in enumerate(cameras):
+        img  = cv.resize(cam.image.image, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+        copy = Camera(sift_desc(img, cam.image.filename, img_id))
+
+        copy.focal = cam.focal * scale
+        copy.ppx   = cam.ppx * scale
+        copy.ppy   = cam.ppy * scale
+        copy.R     = cam.R
+        scaled.append(copy)
+    # for
+    return scaled
+
+
+def save_render_job(job_dir, images_dir, components):
+
+    # Camera params of every panorama, the full render needs no matching
+    store = camera_store(job_dir, max_entries=None)
+    for (component_id, cameras) in enumerate(components):
+        store.save(f'component_{component_id}', cameras)
+    # for
+
+    with open(os.path.join(job_dir, 'job.json'), 'w') as job:
+        json.dump({'images': images_dir, 'components': len(components)}, job)
+    # with
+
+
+def load_render_job(job_dir):
+
+    with open(os.path.join(job_dir, 'job.json')) as job:
+        job = json.load(job)
+    # with
+
+    store      = camera_store(job_dir, max_entries=None)
+    components = []
+    for component_id in range(job['components']):
+        key   = f'component_{component_id}'
+        names = store.filenames(key)
+
+        if names is None:
+            raise ValueError(f'Render job {job_dir} has no cameras for {key}')
+        # if
+
+        cameras = [Camera(sift_desc(cv.imread(os.path.join(job['images'], name)), name, img_id))
+                   for (img_id, name) in enumerate(names)]
+
+        if not store.load(key, cameras):
+            raise ValueError(f'Render job {job_dir} has no cameras for {key}')
+        # if
+        components.append(cameras)
+    # for
+    return components
+
+
+def preview(images_dir, job_dir, store_dir=CAMERA_STORE_DIR):
+
+    components = estimate_cameras(images_dir, store_dir)
+    save_render_job(job_dir, images_dir, components)
+
+    # Compose at PREVIEW_MEGAPIX per image
+    for (component_id, cameras) in enumerate(components):
+        suffix = '' if component_id == 0 else f'_{component_id}'
+        area   = max(cam.image.image.shape[0] * cam.image.image.shape[1] for cam in cameras)
+        scale  = min(1.0, math.sqrt(PREVIEW_MEGAPIX * 1e6 / area))
+
+        stitch = stitch_component(scaled_cameras(cameras, scale))
+
+        cv.imshow(f'Preview{suffix}', stitch.stitched_img)
+        cv.imwrite(f'./preview_img{suffix}.png', stitch.stitched_img)
+        stitch.close()
+    # for
+
+    print(f'Press y to render at full resolution, any other key to stop (--render --job-dir {job_dir} later)', flush=True)
+    key = cv.waitKey(0)
+    cv.destroyAllWindows()
+
+    return key in (ord('y'), ord('Y'))
+
+
+def render(job_dir, output_format=OUTPUT_FORMAT):
+
+    # Tiled on a canvas file of the job, resumes an interrupted render.
+    # The output is written as the rows of tiles finish
+    for (component_id, cameras) in enumerate(load_render_job(job_dir)):
+        suffix = '' if component_id == 0 else f'_{component_id}'
+        writer = make_output_writer(f'./stitched_img{suffix}', output_format)
+
+        stitch = Stitch(cameras, tile_size=STITCH_TILE_SIZE or RENDER_TILE_SIZE,
+                        canvas_path=os.path.join(job_dir, f'canvas{suffix}.raw'), resume=True, writer=writer)
+        stitch.run()
+        stitch.close()
 
-    cv.imshow('Result', stitch.stitched_img)
-    cv.imwrite('./stitched_img.png', stitch.stitched_img) 
+        print(f'Rendered {writer.path}', flush=True)
+    # for
+
+
+def main(argv=None):
+
+    parser = ArgumentParser(description='Panorama stitching')
+    parser.add_argument('images', nargs='?', default=IMAGES_DIR, help='directory of the images')
+    parser.add_argument('--preview', action='store_true', help='compose a low resolution preview first')
+    parser.add_argument('--render', action='store_true', help='full resolution render of the saved job')
+    parser.add_argument('--job-dir', default=RENDER_JOB_DIR, help='directory of the render job')
+    parser.add_argument('--store-dir', default=CAMERA_STORE_DIR, help='directory of the camera checkpoints')
+    parser.add_argument('--no-store', dest='store_dir', action='store_const', const=None,
+                        help='no camera checkpoints, always run the bundle adjustment')
+    parser.add_argument('--format', default=OUTPUT_FORMAT, choices=['png', 'dzi'],
+                        help='png image, or dzi tile pyramid (Deep Zoom)')
+    args = parser.parse_args(argv)
+
+    # JSON lines telemetry of the RANSAC and BA stages
+    if TELEMETRY_PATH is not None:
+        telemetry.enable(TELEMETRY_PATH)
+    # if
+
+    if args.render:
+        render(args.job_dir, args.format)
+        return
+    # if
+
+    if args.preview:
+        if preview(args.images, args.job_dir, args.store_dir):
+            render(args.job_dir, args.format)
+        # if
+        return
+    # if
+
+    components = estimate_cameras(args.images, args.store_dir)
+
+    # Stitch the panoramas in parallel, each written out as it is rendered
+    suffixes = ['' if component_id == 0 else f'_{component_id}' for component_id in range(len(components))]
+    writers  = [make_output_writer(f'./stitched_img{suffix}', args.format) for suffix in suffixes]
+    with ThreadPoolExecutor(max_workers=COMPONENT_WORKERS) as pool:
+        stitches = list(pool.map(stitch_component, components, writers))
+    # with
+
+    for (suffix, stitch) in zip(suffixes, stitches):
+        cv.imshow(f'Result{suffix}', stitch.stitched_img)
+    # for
     cv.waitKey(0)
+
+    for stitch in stitches:
+        stitch.close()
+    # for
 #
 
 
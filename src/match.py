@@ -22,10 +22,10 @@ ToDo:
 '''
 
 # CUSTOM IMPORTS
-
+from focal_estimation import focals_from_homographies
 
 # OTHER IMPORTS
-from numpy import sqrt, isinf, abs
+from numpy import sqrt
 
 
 class Match:
@@ -100,30 +100,9 @@ class Match:
     ------
     Returns the focal length
     '''
-    h = self._homography
-
-    f1 = None
-    f0 = None
-
-    d1 = (h[2][0] * h[2][1])
-    d2 = (h[2][1] - h[2][0]) * (h[2][1] + h[2][0])
-    v1 = -(h[0][0] * h[0][1] + h[1][0] * h[1][1]) / d1
-    v2 = (h[0][0] * h[0][0] + h[1][0] * h[1][0] - h[0][1] * h[0][1] - h[1][1] * h[1][1]) / d2
-    if (v1 < v2): temp = v1; v1 = v2; v2 = temp
-    if (v1 > 0 and v2 > 0): f1 = sqrt(v1 if abs(d1) > abs(d2) else v2)
-    elif (v1 > 0): f1 = sqrt(v1)
-    else: return 0
-
-    d1 = h[0][0] * h[1][0] + h[0][1] * h[1][1]
-    d2 = h[0][0] * h[0][0] + h[0][1] * h[0][1] - h[1][0] * h[1][0] - h[1][1] * h[1][1]
-    v1 = -h[0][2] * h[1][2] / d1
-    v2 = (h[1][2] * h[1][2] - h[0][2] * h[0][2]) / d2
-    if (v1 < v2): temp = v1; v1 = v2; v2 = temp
-    if (v1 > 0 and v2 > 0): f0 = sqrt(v1 if abs(d1) > abs(d2) else v2)
-    elif (v1 > 0): f0 = sqrt(v1)
-    else: return 0
-
-    if (isinf(f1) or isinf(f0)):
+    f0, f1, valid0, valid1 = focals_from_homographies(self._homography)
+
+    if not (valid0[0] and valid1[0]):
       return 0
 
-    return sqrt(f1 * f0)
+    return sqrt(f1[0] * f0[0])
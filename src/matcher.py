@@ -148,7 +148,7 @@ class Matcher:
                 kptB = array([x.pt for x in ptB], dtype=float32)
 
                 # Get the homography matrix
-                H, bestInliers = use_ransac(kptA, kptB, 500, 4)
+                H, bestInliers = use_ransac(kptA, kptB, 500, 4, pair=(query_img, target_img))
 
                 for i in range(len(bestInliers)):
                     bestInliers[i][0], bestInliers[i][1] = bestInliers[i][1], bestInliers[i][0]
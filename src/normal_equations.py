@@ -0,0 +1,227 @@
+module_name = 'Normal Equations'
+
+'''
+Version: v1.0.0
+
+Description:
+    Block-sparse normal equations of the bundle adjustment.
+    Only the 6x6 camera-pair blocks that co-occur in a match are
+    stored, so the memory grows with the edges of the match graph
+    instead of points x cameras.
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    <***>
+
+Notes:
+    The jacobian itself is never stored, each match block is folded
+    into JtJ and J^T r as soon as it is computed.
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+import telemetry
+
+# OTHER IMPORTS
+from numpy                import zeros, float64, array, linalg, diag_indices, where
+from scipy.sparse         import bsr_matrix, block_diag, diags
+from scipy.sparse.linalg  import spsolve, cg, LinearOperator
+from utils                import PARAMS_PER_CAMERA, SPARSE_PCG_MIN_CAMERAS, PCG_TOLERANCE, PCG_MAX_ITR
+
+# USER INTERFACE
+
+
+class normal_equations:
+    def __init__(self, num_cams):
+        self._num_cams = num_cams
+        self._blocks   = {}
+        self._Jtr      = zeros((PARAMS_PER_CAMERA * num_cams), dtype=float64)
+    #
+
+    @property
+    def Jtr(self):
+        return self._Jtr
+    #
+
+    @property
+    def num_blocks(self):
+        return len(self._blocks)
+    #
+
+    def diagonal(self):
+        '''
+        Returns the diagonal of JtJ
+        '''
+        diag = zeros((PARAMS_PER_CAMERA * self._num_cams), dtype=float64)
+        for cam_id in range(self._num_cams):
+            if (cam_id, cam_id) in self._blocks:
+                diag[cam_id*PARAMS_PER_CAMERA:(cam_id+1)*PARAMS_PER_CAMERA] = self._blocks[(cam_id, cam_id)].diagonal()
+            # if
+        # for
+        return diag
+    #
+
+    def gradient(self, fixed=None):
+        '''
+        Returns J^T r with the fixed params zeroed
+        '''
+        Jtr = self._Jtr.copy()
+        if fixed is not None:
+            Jtr[fixed] = 0
+        # if
+        return Jtr
+    #
+
+    def _damped_block(self, cam_i, cam_j, block, damping, fixed):
+        '''
+        Applies the damping and removes the fixed params from a block.
+        Fixed params get an identity row so their update is zero
+        '''
+        block = block.copy()
+        idx_i = slice(cam_i*PARAMS_PER_CAMERA, (cam_i+1)*PARAMS_PER_CAMERA)
+        idx_j = slice(cam_j*PARAMS_PER_CAMERA, (cam_j+1)*PARAMS_PER_CAMERA)
+
+        if (damping is not None) and (cam_i == cam_j):
+            block[diag_indices(PARAMS_PER_CAMERA)] += damping[idx_i]
+        # if
+
+        if fixed is not None:
+            block[fixed[idx_i], :] = 0
+            block[:, fixed[idx_j]] = 0
+            if cam_i == cam_j:
+                block[diag_indices(PARAMS_PER_CAMERA)] += fixed[idx_i]
+            # if
+        # if
+        return block
+    #
+
+    def _add_block(self, cam_i, cam_j, block):
+        if (cam_i, cam_j) in self._blocks:
+            self._blocks[(cam_i, cam_j)] += block
+        else:
+            self._blocks[(cam_i, cam_j)] = block.copy()
+        # if
+    #
+
+    def add_match(self, from_id, to_id, J_match, residuals):
+        '''
+        Folds the jacobian block of a match into the system
+
+        Input:
+        ------
+        from_id  : index of the camera mapping from
+        to_id    : index of the camera mapping to
+        J_match  : (2N, 12) jacobian block, cam_from columns first
+        residuals: (2N,) residuals of the match
+        '''
+        JtJ_match = J_match.T @ J_match
+        Jtr_match = J_match.T @ residuals
+
+        cams = [(from_id, 0), (to_id, PARAMS_PER_CAMERA)]
+        for (cam_i, b1) in cams:
+            for (cam_j, b2) in cams:
+                self._add_block(cam_i, cam_j, JtJ_match[b1:b1+PARAMS_PER_CAMERA, b2:b2+PARAMS_PER_CAMERA])
+            # for
+
+            self._Jtr[cam_i*PARAMS_PER_CAMERA:(cam_i+1)*PARAMS_PER_CAMERA] += Jtr_match[b1:b1+PARAMS_PER_CAMERA]
+        # for
+    #
+
+    def JtJ(self, damping=None, fixed=None):
+        '''
+        Assembles the block-sparse JtJ
+
+        Input:
+        ------
+        damping: optional vector added to the diagonal
+        fixed  : optional mask of the params held fixed
+
+        Output:
+        -------
+        Returns JtJ as a scipy bsr matrix
+        '''
+        # Every camera keeps a diagonal block, even one without active matches
+        empty   = zeros((PARAMS_PER_CAMERA, PARAMS_PER_CAMERA), dtype=float64)
+        keys    = sorted(set(self._blocks) | {(cam_id, cam_id) for cam_id in range(self._num_cams)})
+        data    = array([self._damped_block(cam_i, cam_j, self._blocks.get((cam_i, cam_j), empty), damping, fixed)
+                         for (cam_i, cam_j) in keys], dtype=float64)
+        indices = array([cam_j for (_, cam_j) in keys])
+        indptr  = zeros((self._num_cams + 1), dtype=int)
+        for (cam_i, _) in keys:
+            indptr[cam_i+1] += 1
+        # for
+        indptr = indptr.cumsum()
+
+        size = self._num_cams * PARAMS_PER_CAMERA
+        return bsr_matrix((data, indices, indptr), shape=(size, size))
+    #
+
+    def undamped(self, fixed=None):
+        '''
+        JtJ with the fixed params removed but without damping. Built
+        once, it can be passed to solve for several damping values
+        '''
+        return self.JtJ(None, fixed).tocsr()
+    #
+
+    def _block_jacobi(self, damping=None, fixed=None):
+        '''
+        Inverse of the diagonal camera blocks, used as preconditioner
+        '''
+        inv_blocks = []
+        for cam_id in range(self._num_cams):
+            block = self._blocks.get((cam_id, cam_id), zeros((PARAMS_PER_CAMERA, PARAMS_PER_CAMERA)))
+            block = self._damped_block(cam_id, cam_id, block, damping, fixed)
+            inv_blocks.append(linalg.pinv(block))
+        # for
+        M = block_diag(inv_blocks, format='csr')
+
+        return LinearOperator(M.shape, matvec=M.dot, dtype=float64)
+    #
+
+    def solve(self, damping=None, fixed=None, undamped=None):
+        '''
+        Solves (JtJ + diag(damping)) x = J^T r, the cached JtJ and
+        J^T r are left untouched so the system can be solved again
+        with another damping
+
+        Small systems are factorised directly, large ones use
+        block-Jacobi preconditioned conjugate gradients, factorised
+        too when these do not converge in PCG_MAX_ITR iterations
+
+        Input:
+        ------
+        damping : optional vector added to the diagonal
+        fixed   : optional mask of the params held fixed, their update is zero
+        undamped: optional result of undamped(fixed) to reuse
+        '''
+        if undamped is None:
+            undamped = self.undamped(fixed)
+        # if
+
+        JtJ = undamped
+        if damping is not None:
+            JtJ = undamped + diags(damping if fixed is None else where(fixed, 0, damping))
+        # if
+        Jtr = self.gradient(fixed)
+
+        if self._num_cams < SPARSE_PCG_MIN_CAMERAS:
+            return spsolve(JtJ.tocsc(), Jtr)
+        # if
+
+        JtJ     = JtJ.tocsr()
+        x, info = cg(JtJ, Jtr, rtol=PCG_TOLERANCE, maxiter=PCG_MAX_ITR, M=self._block_jacobi(damping, fixed))
+
+        # An unconverged step would mislead the LM gain ratio
+        if info != 0:
+            telemetry.event('pcg_fallback', info=info, cameras=self._num_cams, max_iterations=PCG_MAX_ITR)
+            return spsolve(JtJ.tocsc(), Jtr)
+        # if
+        return x
+    #
@@ -0,0 +1,302 @@
+module_name = 'Output Writers'
+
+'''
+Version: v1.0.0
+
+Description:
+    Writers of the finished panorama, fed by Stitch one row strip at a
+    time as the tile rows of the canvas finish. Neither the panorama
+    nor its encoding is ever held whole in memory.
+
+        png_writer      : one PNG, the strips deflated into IDAT chunks
+                          as they come
+        deep_zoom_writer: Deep Zoom pyramid, a .dzi descriptor and a
+                          directory of JPEG tiles per level, every level
+                          built from the strips of the one above
+
+    Each writer is opened with the canvas size, written strips of BGR
+    uint8 rows top to bottom, then closed.
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    https://www.w3.org/TR/png/
+    https://learn.microsoft.com/en-us/previous-versions/windows/silverlight/dotnet-windows-silverlight/cc645077(v=vs.95)
+
+Notes:
+    The PNG rows use the Sub filter, cheap to compute on a strip and
+    a good deal smaller than unfiltered rows. A Deep Zoom level halves
+    the one above, 2x2 means with the last row and column repeated on
+    odd sizes, down to a single pixel.
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+
+# OTHER IMPORTS
+import os
+import shutil
+import struct
+import zlib
+import cv2   as cv
+import numpy as np
+from utils   import OUTPUT_FORMAT, PNG_COMPRESSION, DZI_TILE_SIZE, DZI_OVERLAP, DZI_QUALITY
+
+# USER INTERFACE
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+DZI_NAMESPACE = 'http://schemas.microsoft.com/deepzoom/2008'
+
+
+class png_writer:
+    '''
+    8 bit RGB PNG written strip by strip
+    '''
+    extension = '.png'
+
+    def __init__(self, path, compression=PNG_COMPRESSION):
+        '''
+        Input:
+        ------
+        path       : file of the image
+        compression: zlib level, 1 fastest to 9 smallest
+        '''
+        self.path         = path
+        self._compression = compression
+        self._file        = None
+    #
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack('>I', len(data)) + kind + data)
+        self._file.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+    #
+
+    def open(self, width, height):
+        self._size       = (width, height)
+        self._rows       = 0
+        self._compressor = zlib.compressobj(self._compression)
+
+        self._file = open(self.path, 'wb')
+        self._file.write(PNG_SIGNATURE)
+
+        # 8 bit depth, colour type 2 (RGB), deflate, adaptive filtering, no interlace
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+    #
+
+    def write(self, rows):
+        '''
+        Input:
+        ------
+        rows: (N, W, 3) BGR uint8 strip, following the previous one
+        '''
+        rgb = np.ascontiguousarray(rows[..., ::-1]).reshape(rows.shape[0], -1)
+
+        # Sub filter, each byte minus the same channel of the pixel to its left
+        filtered        = np.empty((rgb.shape[0], rgb.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0]  = 1
+        filtered[:, 1:] = rgb
+        filtered[:, 4:] -= rgb[:, :-3]
+
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+        # if
+        self._rows += rows.shape[0]
+    #
+
+    def close(self):
+        self._chunk(b'IDAT', self._compressor.flush())
+        self._chunk(b'IEND', b'')
+        self._file.close()
+        self._file = None
+
+        if (self._rows != self._size[1]):
+            raise ValueError(f'{self.path} got {self._rows} rows, expected {self._size[1]}')
+        # if
+    #
+
+
+class _dzi_level:
+    '''
+    One level of the pyramid, buffers the rows of its next row of tiles
+    and hands its rows, halved, to the level below
+    '''
+
+    def __init__(self, tiles_dir, level, width, height, tile_size, overlap, quality, below):
+        self._dir       = os.path.join(tiles_dir, str(level))
+        self._size      = (width, height)
+        self._tile_size = tile_size
+        self._overlap   = overlap
+        self._params    = [cv.IMWRITE_JPEG_QUALITY, quality]
+        self._below     = below
+
+        self._buffer   = np.zeros((0, width, 3), dtype=np.uint8)
+        self._buffer_y = 0              # Canvas row of the first buffered row
+        self._tile_row = 0              # Next row of tiles to write
+        self._odd_row  = None           # Row waiting for its pair to be halved
+        os.makedirs(self._dir)
+    #
+
+    def _write_tiles(self, final=False):
+        '''
+        Writes every row of tiles the buffer covers, overlap included
+        '''
+        (w, h) = self._size
+        T, ov  = self._tile_size, self._overlap
+
+        while (self._tile_row * T < h):
+            y0 = max(self._tile_row * T - ov, 0)
+            y1 = min((self._tile_row + 1) * T + ov, h)
+            if (self._buffer_y + self._buffer.shape[0] < y1) and not final:
+                break
+            # if
+
+            strip = self._buffer[y0 - self._buffer_y:y1 - self._buffer_y]
+            for col in range(-(-w // T)):
+                x0 = max(col * T - ov, 0)
+                x1 = min((col + 1) * T + ov, w)
+                cv.imwrite(os.path.join(self._dir, f'{col}_{self._tile_row}.jpg'),
+                           np.ascontiguousarray(strip[:, x0:x1]), self._params)
+            # for
+
+            # Only the overlap of the next row of tiles stays
+            self._tile_row += 1
+            keep            = max(self._tile_row * T - ov, 0)
+            self._buffer    = self._buffer[keep - self._buffer_y:]
+            self._buffer_y  = keep
+        # while
+    #
+
+    def _halve(self, rows):
+        '''
+        2x2 means of pairs of rows, the last column repeated on odd widths
+        '''
+        if (rows.shape[1] % 2):
+            rows = np.concatenate([rows, rows[:, -1:]], axis=1)
+        # if
+        rows = rows.astype(np.uint16)
+        sums = rows[0::2, 0::2] + rows[0::2, 1::2] + rows[1::2, 0::2] + rows[1::2, 1::2]
+        return ((sums + 2) // 4).astype(np.uint8)
+    #
+
+    def write(self, rows):
+        self._buffer = np.concatenate([self._buffer, rows])
+        self._write_tiles()
+
+        if self._below is None:
+            return
+        # if
+
+        if self._odd_row is not None:
+            rows = np.concatenate([self._odd_row, rows])
+        # if
+        pairs         = rows.shape[0] - rows.shape[0] % 2
+        self._odd_row = rows[pairs:] if (pairs < rows.shape[0]) else None
+
+        if pairs:
+            self._below.write(self._halve(rows[:pairs]))
+        # if
+    #
+
+    def close(self):
+        self._write_tiles(final=True)
+
+        if self._below is None:
+            return
+        # if
+
+        # Last row of an odd height paired with itself
+        if self._odd_row is not None:
+            self._below.write(self._halve(np.concatenate([self._odd_row, self._odd_row])))
+            self._odd_row = None
+        # if
+        self._below.close()
+    #
+
+
+class deep_zoom_writer:
+    '''
+    Deep Zoom tile pyramid, written level by level as the strips come:
+    path.dzi and the tiles path_files/<level>/<col>_<row>.jpg
+    '''
+    extension = '.dzi'
+
+    def __init__(self, path, tile_size=DZI_TILE_SIZE, overlap=DZI_OVERLAP, quality=DZI_QUALITY):
+        '''
+        Input:
+        ------
+        path     : .dzi descriptor, the tiles go next to it
+        tile_size: side of the tiles, without their overlap
+        overlap  : pixels each tile shares with its neighbours
+        quality  : JPEG quality of the tiles
+        '''
+        self.path       = path
+        self._tile_size = tile_size
+        self._overlap   = overlap
+        self._quality   = quality
+        self._tiles_dir = os.path.splitext(path)[0] + '_files'
+    #
+
+    def open(self, width, height):
+        self._size = (width, height)
+
+        # Tiles of an earlier pyramid would be mixed in
+        if os.path.isdir(self._tiles_dir):
+            shutil.rmtree(self._tiles_dir)
+        # if
+
+        # Level 0 is a single pixel, the top level the full canvas
+        top   = int(np.ceil(np.log2(max(width, height, 1))))
+        level = None
+        for index in range(top + 1):
+            level = _dzi_level(self._tiles_dir, index, -(-width // 2**(top - index)), -(-height // 2**(top - index)),
+                               self._tile_size, self._overlap, self._quality, level)
+        # for
+        self._top = level
+    #
+
+    def write(self, rows):
+        '''
+        Input:
+        ------
+        rows: (N, W, 3) BGR uint8 strip, following the previous one
+        '''
+        self._top.write(np.asarray(rows))
+    #
+
+    def close(self):
+        self._top.close()
+
+        # Written last, a descriptor means a complete pyramid
+        with open(self.path, 'w') as dzi:
+            dzi.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                      f'<Image xmlns="{DZI_NAMESPACE}" Format="jpg" Overlap="{self._overlap}" '
+                      f'TileSize="{self._tile_size}">\n'
+                      f'  <Size Width="{self._size[0]}" Height="{self._size[1]}"/>\n'
+                      '</Image>\n')
+        # with
+    #
+
+
+OUTPUT_WRITERS = {'png': png_writer, 'dzi': deep_zoom_writer}
+
+
+def make_output_writer(stem, mode=OUTPUT_FORMAT, **kwargs):
+    '''
+    Input:
+    ------
+    stem  : output path without its extension, the writer adds it
+    mode  : 'png' or 'dzi'
+    kwargs: options of the writer, e.g. compression or tile_size
+    '''
+    if mode not in OUTPUT_WRITERS:
+        raise ValueError(f'Unknown output format {mode}, expected one of {sorted(OUTPUT_WRITERS)}')
+    # if
+
+    writer = OUTPUT_WRITERS[mode]
+    return writer(stem + writer.extension, **kwargs)
+#
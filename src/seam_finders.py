@@ -0,0 +1,187 @@
+module_name = 'Seam Finders'
+
+'''
+Version: v1.0.0
+
+Description:
+    Seams between the warped images, found on a downscaled copy of
+    the canvas (SEAM_MEGAPIX per image) and upsampled by Stitch.
+
+        dp_seam_finder: the images are laid down in the camera order,
+                        each new one cuts the composite along the
+                        cheapest path through their overlap, found by
+                        dynamic programming over the colour difference
+
+    find() takes the low resolution parts (rect, image, mask), the
+    rect in the downscaled canvas and the mask the pixels the image
+    covers, and returns the mask of the pixels each image keeps.
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    Efros, Freeman: Image quilting for texture synthesis and transfer
+    (2001), minimum error boundary cut
+
+Notes:
+    The cut runs across the overlap, top to bottom when the new image
+    sits to the left or right of the composite, left to right when it
+    sits above or below. The masks are dilated by a pixel, past the
+    image border too, so the upsampled seams leave no gaps. Stitch
+    bounds them by the full resolution coverage.
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+
+# OTHER IMPORTS
+import cv2   as cv
+import numpy as np
+from utils   import SEAM_FINDER
+
+# USER INTERFACE
+OUTSIDE_OVERLAP_COST = 1e9
+
+
+class dp_seam_finder:
+
+    def _cut(self, cost):
+        '''
+        Cheapest top to bottom path, a pixel step left or right per row
+
+        Input:
+        ------
+        cost: (H, W) cost of each pixel
+
+        Output:
+        -------
+        Returns the (H,) column of the path in each row
+        '''
+        h, w   = cost.shape
+        energy = cost.astype(np.float64)
+        moves  = np.zeros((h, w), dtype=np.int8)
+
+        for row in range(1, h):
+            above = energy[row - 1]
+            left  = np.concatenate([[np.inf], above[:-1]])
+            right = np.concatenate([above[1:], [np.inf]])
+
+            choice       = np.argmin(np.stack([left, above, right]), axis=0)
+            moves[row]   = choice - 1
+            energy[row] += np.choose(choice, [left, above, right])
+        # for
+
+        path     = np.zeros((h), dtype=np.int64)
+        path[-1] = np.argmin(energy[-1])
+        for row in range(h - 1, 0, -1):
+            path[row - 1] = path[row] + moves[row, path[row]]
+        # for
+        return path
+    #
+
+    def _new_side(self, composite, image, old, new):
+        '''
+        Pixels of the overlap of old and new on the side of the new image
+
+        Input:
+        ------
+        composite: (H, W, 3) image laid down so far
+        image    : (H, W, 3) new image
+        old, new : (H, W) coverage of the composite and of the new image
+        '''
+        overlap = old & new
+        only_new, only_old = new & ~old, old & ~new
+
+        if not only_new.any():
+            return np.zeros_like(overlap)
+        # if
+        if not only_old.any():
+            return overlap
+        # if
+
+        # Direction from the composite to the new image
+        [dy, dx] = np.argwhere(only_new).mean(axis=0) - np.argwhere(only_old).mean(axis=0)
+
+        # Colour difference, raised near the overlap border so the cut
+        # leaves room on both sides for blending
+        border_dist = cv.distanceTransform(overlap.astype(np.uint8), cv.DIST_L2, 3)
+        cost = ((composite.astype(np.float32) - image.astype(np.float32))**2).sum(axis=2) + 1
+        cost = cost / np.maximum(border_dist, 1)
+        cost[~overlap] = OUTSIDE_OVERLAP_COST
+
+        # Turned so the cut runs top to bottom with the new image on the right
+        vertical = abs(dx) >= abs(dy)
+        flip     = (dx < 0) if vertical else (dy < 0)
+
+        cost = cost if vertical else cost.T
+        cost = cost[:, ::-1] if flip else cost
+
+        path = self._cut(cost)
+        side = np.arange(cost.shape[1])[None, :] > path[:, None]
+
+        side = side[:, ::-1] if flip else side
+        side = side if vertical else side.T
+        return overlap & side
+    #
+
+    def find(self, parts):
+        '''
+        Input:
+        ------
+        parts: list of (rect, image, mask) in the camera order
+
+        Output:
+        -------
+        Returns the uint8 mask (0 or 1) of the pixels each part keeps
+        '''
+        x0 = min(rect[0] for (rect, _, _) in parts)
+        y0 = min(rect[1] for (rect, _, _) in parts)
+        x1 = max(rect[2] for (rect, _, _) in parts)
+        y1 = max(rect[3] for (rect, _, _) in parts)
+
+        labels    = np.full((y1 - y0, x1 - x0), -1, dtype=np.int32)
+        composite = np.zeros((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        regions   = []
+
+        for (part_id, ((rx0, ry0, rx1, ry1), image, mask)) in enumerate(parts):
+            region = (slice(ry0 - y0, ry1 - y0), slice(rx0 - x0, rx1 - x0))
+            old    = labels[region] >= 0
+
+            take = (mask & ~old) | self._new_side(composite[region], image, old, mask)
+            labels[region][take]    = part_id
+            composite[region][take] = image[take]
+            regions.append(region)
+        # for
+
+        kernel = np.ones((3, 3), dtype=np.uint8)
+        return [cv.dilate((labels[region] == part_id).astype(np.uint8), kernel)
+                for (part_id, region) in enumerate(regions)]
+    #
+
+
+SEAM_FINDERS = {'dp': dp_seam_finder}
+
+
+def make_seam_finder(mode=SEAM_FINDER):
+    '''
+    Input:
+    ------
+    mode: 'dp', or None for no seam estimation
+
+    Output:
+    -------
+    Returns the seam finder, None when mode is None
+    '''
+    if mode is None:
+        return None
+    # if
+
+    if mode not in SEAM_FINDERS:
+        raise ValueError(f'Unknown seam finder {mode}, expected one of {sorted(SEAM_FINDERS)}')
+    # if
+    return SEAM_FINDERS[mode]()
+#
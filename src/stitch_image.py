@@ -1,13 +1,60 @@
 import numpy as np
 import cv2 as cv
 import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from tempfile import TemporaryFile
+from utils import STITCH_TILE_SIZE, STITCH_CANVAS_PATH, STITCH_WORKERS, STITCH_PROJECTION, BLEND_MODE, SEAM_MEGAPIX
+from utils import STITCH_MEMORY_BUDGET, CAMERA_EXTENT_OUTLIER, MIN_OUTPUT_SCALE, OUTPUT_STRIP_ROWS, REMAP_CHUNK_PIXELS
+import telemetry
+from warpers import make_warper
+from blenders import make_blender
+from seam_finders import make_seam_finder
+from gain_compensation import make_gain_compensator
 
 
 class Stitch:
 
-  def __init__(self, cameras):
+  def __init__(self, cameras, tile_size=STITCH_TILE_SIZE, canvas_path=STITCH_CANVAS_PATH, workers=STITCH_WORKERS,
+               warper=None, blender=None, seam_finder=None, gain_compensator=None, resume=False,
+               memory_budget=STITCH_MEMORY_BUDGET, writer=None):
+    '''
+    tile_size  : side of the square tiles the canvas is rendered in, None
+                 renders the whole canvas at once in memory
+    canvas_path: file of the np.memmap canvas when tiling, a temporary
+                 file when None, open until close()
+    workers    : threads warping the tiles or the cameras, None uses
+                 every core
+    warper     : compositing surface (see warpers), STITCH_PROJECTION
+                 when None
+    blender    : blending of the overlaps (see blenders), BLEND_MODE
+                 when None
+    seam_finder: seams between the images (see seam_finders),
+                 SEAM_FINDER when None
+    gain_compensator: exposure compensation (see gain_compensation),
+                 GAIN_COMPENSATION when None
+    resume     : with a tile size and a canvas path, keeps the tiles an
+                 interrupted run of the same cameras and settings
+                 already wrote to the canvas file
+    memory_budget: bytes the canvas and the rendering may take, the
+                 output is scaled down to fit. None for no limit
+    writer     : output writer (see output_writers) the canvas is
+                 streamed to, each row of tiles once finished
+    '''
     self._cameras = cameras
     self._stitched_img = None
+    self._canvas_file = None
+    self._tile_size = tile_size
+    self._canvas_path = canvas_path
+    self._workers = workers or os.cpu_count()
+    self._warper = warper or make_warper(STITCH_PROJECTION)
+    self._blender = blender or make_blender(BLEND_MODE)
+    self._seam_finder = seam_finder or make_seam_finder()
+    self._gain_compensator = gain_compensator or make_gain_compensator()
+    self._resume = resume
+    self._memory_budget = memory_budget
+    self._writer = writer
 
 
   @property
@@ -15,83 +62,542 @@ class Stitch:
     return self._stitched_img
 
 
+  def close(self):
+    '''
+    Releases the canvas, and the temporary file of a tiled canvas
+    without canvas path
+    '''
+    self._stitched_img = None
+    if self._canvas_file is not None:
+      self._canvas_file.close()
+      self._canvas_file = None
+
+
   def run(self):
     '''
     Stitch all camera images into a single image
+
+    Each image is warped only into its bounding box on the canvas (its
+    ROI) and pasted at the ROI offset, so memory and warp time follow
+    the image area instead of the canvas area times the image count
+
+    With a tile size the canvas is a np.memmap on disk rendered tile
+    by tile, each tile warping only the cameras whose ROI intersects
+    it, so the memory is bounded by the tile size, not the panorama
+
+    The tiles (or the cameras of a single tile) are warped on a thread
+    pool, cv.warpPerspective and cv.remap release the GIL. They are
+    merged in the camera order whatever the number of workers
+
+    A blender with a margin (multi-band) gets each tile grown by its
+    margin, its pyramids never span more than that, and the tiles are
+    cropped back. Without a tile size of its own the in memory canvas
+    is then rendered in tiles of the blender
+
+    Seams and gains are estimated once on a copy of the canvas
+    downscaled to SEAM_MEGAPIX per image, each tile upsamples the seam masks and
+    gain maps of its cameras
+
+    The finished tiles of a canvas file are listed next to it once
+    flushed, under a hash of the cameras and of the compositing
+    settings. A resumed run with the same ones renders only the other
+    tiles. The list is removed once the canvas is finished
+
+    The canvas is planned first (see plan), outlier cameras are left
+    out and the output is scaled to the memory budget
+
+    A writer gets the canvas row strip by row strip as the rows of
+    tiles finish, from a resumed canvas too, so the output is encoded
+    while rendering and never from the whole panorama at once
     '''
 
     # Get identity image (used as ref frame)
     identity_cam = self._get_identity_cam();
 
-    # For each non-identity image, calculate transform
-    offsets = {}
-
-    x_min_best = 9_000_000_000
-    y_min_best = 9_000_000_000
-    x_max_best = -9_000_000_000
-    y_max_best = -9_000_000_000
+    plan = self.plan()
+    origin = plan['origin']
+    out_scale = plan['scale']
+    canvas_w = plan['canvas_w']
+    canvas_h = plan['canvas_h']
 
+    # ROI of every camera, in compositing order
+    rois = {}
     for cam in self._cameras:
+      if any(cam is rejected for rejected in plan['rejected']):
+        continue
 
-      h,w = cam.image.image.shape[:2]
+      roi = self._warper.roi(cam, identity_cam, origin, plan['full_w'], plan['full_h'])
+      if roi is not None:
+        rois[cam] = self._scale_rect(roi, out_scale, canvas_w, canvas_h)
 
-      pts = np.float32([[0,0],[0,h],[w,h],[w,0]]).reshape(-1,1,2)
-      H = identity_cam.K @ identity_cam.R @ cam.R.T @ np.linalg.pinv(cam.K)
-      transformed_corners = cv.perspectiveTransform(pts, H)
+    # Parts are in the output canvas, the warpers scale from the full one
+    warp = lambda cam, part, image=None, scale=1.0: self._warper.warp(cam, identity_cam, origin, part, image,
+                                                                      scale * out_scale)
 
-      [x_min, y_min] = np.int32(transformed_corners.min(axis=0).ravel()) # x,y
-      [x_max, y_max] = np.int32(transformed_corners.max(axis=0).ravel()) # x,y
+    # Warped along with each image, positive where the warp covers the
+    # canvas: the distance to the image border when the blending needs
+    # weights, a plain validity mask otherwise. The uint8 mask of ones
+    # interpolates back to 1 only on pixels mostly inside the image
+    self._weights = {}
+    for cam in rois:
+      if self._blender.needs_weights or (self._seam_finder is not None):
+        self._weights[cam] = self._border_distance(cam.image.image.shape)
+      else:
+        self._weights[cam] = np.ones(cam.image.image.shape[:2], dtype=np.uint8)
 
-      if (x_min < x_min_best):
-        x_min_best = x_min
+    # Seams and gains on a downscaled canvas
+    self._low_res = {}
+    if (self._seam_finder is not None) or (self._gain_compensator is not None):
+      self._low_res = self._low_res_pass(rois, warp, canvas_w, canvas_h)
 
-      if (y_min < y_min_best):
-        y_min_best = y_min
+    render_key = self._render_key(out_scale)
+    done = self._load_progress(canvas_w, canvas_h, render_key)
+    final_img = self._new_canvas(canvas_w, canvas_h, done is not None)
+    if done is None:
+      self._start_progress(canvas_w, canvas_h, render_key)
+      done = set()
 
-      if (x_max > x_max_best):
-        x_max_best = x_max
-      
-      if (y_max > y_max_best):
-        y_max_best = y_max
+    all_tiles = list(self._tiles(canvas_w, canvas_h))
+    tiles = [tile for tile in all_tiles if tile not in done]
 
-      offsets[cam] = H
+    # Rows of tiles, streamed to the writer in order as they finish
+    tile_rows = sorted({(tile[1], tile[3]) for tile in all_tiles})
+    tiles_left = {y0: 0 for (y0, _) in tile_rows}
+    for tile in tiles:
+      tiles_left[tile[1]] += 1
 
-    # Create final sized frame to create image in
-    im_x_0 = x_min_best
-    im_y_0 = y_min_best
-    results = []
-    for (cam, H) in offsets.items():
-      # if (cam == identity_cam): 
-      #   continue
+    if self._writer is not None:
+      self._writer.open(canvas_w, canvas_h)
+    next_row = self._stream_rows(final_img, tile_rows, tiles_left, 0)
 
-      im_x_shift = -im_x_0
-      im_y_shift = -im_y_0
+    finished = []
+    with ThreadPoolExecutor(max_workers=self._workers) as pool:
+      for (tile, tile_img) in self._render_tiles(tiles, rois, warp, pool):
+        final_img[tile[1]:tile[3], tile[0]:tile[2]] = tile_img
+        finished.append(tile)
 
-      Ht = np.array([
-        [1,0,im_x_shift],
-        [0,1,im_y_shift],
-        [0,0,1]])
+        tiles_left[tile[1]] -= 1
+        next_row = self._stream_rows(final_img, tile_rows, tiles_left, next_row)
 
-      result = cv.warpPerspective(cam.image.image,  Ht @ H, (x_max_best-x_min_best, y_max_best-y_min_best))
-      results.append(result)
+        if (len(finished) >= 2 * self._workers):
+          self._save_progress(final_img, finished)
+          finished = []
 
-    final_img = results[0]
-    for res in results[1:]:
-      rows,cols,channels = res.shape
-      res_gray = cv.cvtColor(res, cv.COLOR_BGR2GRAY)
-      ret, mask = cv.threshold(res_gray, 0, 255, cv.THRESH_BINARY)
-      mask_inv = cv.bitwise_not(mask)
+    self._save_progress(final_img, finished)
 
-      final_img_bg = cv.bitwise_and(final_img, final_img, mask=mask_inv)
-      res_img_fg = cv.bitwise_and(res, res, mask=mask)
+    if self._writer is not None:
+      self._writer.close()
 
-      dst = cv.add(final_img_bg, res_img_fg)
-      final_img[0:rows,0:cols] = dst
+    # A finished canvas is no longer resumable
+    self._end_progress()
 
-    final_img[np.where((final_img==[0,0,0]).all(axis=2))] = [255,255,255]
     self._stitched_img = final_img
 
 
+  def plan(self):
+    '''
+    Canvas of the panorama, before anything is warped or allocated
+
+    Cameras with no extent on the surface (e.g. behind the reference
+    plane) or CAMERA_EXTENT_OUTLIER times wider or taller than the
+    median camera come from bad rotations and are left out. The output
+    scale is the largest, up to 1, whose estimated memory fits the
+    budget
+
+    Output:
+    -------
+    Returns a dict of
+      origin            : surface coordinates of the canvas corner
+      full_w, full_h    : canvas size at full scale
+      canvas_w, canvas_h: canvas size at the output scale
+      scale             : output scale
+      memory            : estimated bytes at the output scale
+      rejected          : list of the cameras left out
+
+    Raises a ValueError, before any allocation, when even
+    MIN_OUTPUT_SCALE does not fit the budget
+    '''
+    identity_cam = self._get_identity_cam()
+
+    bounds = {}
+    rejected = []
+    for cam in self._cameras:
+
+      # Extent of the image on the compositing surface
+      cam_bounds = self._warper.bounds(cam, identity_cam)
+      if (cam_bounds is None) and (cam is not identity_cam):
+        rejected.append(cam)
+      else:
+        bounds[cam] = cam_bounds
+
+    extents = np.array([[x_max - x_min, y_max - y_min] for (x_min, y_min, x_max, y_max) in bounds.values()],
+                       dtype=np.float64)
+    limit = CAMERA_EXTENT_OUTLIER * np.maximum(np.median(extents, axis=0), 1)
+    for (cam, extent) in zip(list(bounds), extents):
+      if (cam is not identity_cam) and np.any(extent > limit):
+        rejected.append(cam)
+        del bounds[cam]
+
+    for cam in rejected:
+      print(f'Camera {cam.image.filename} left out of the panorama, its projection explodes', flush=True)
+
+    x_min_best = min(int(cam_bounds[0]) for cam_bounds in bounds.values())
+    y_min_best = min(int(cam_bounds[1]) for cam_bounds in bounds.values())
+    x_max_best = max(int(cam_bounds[2]) for cam_bounds in bounds.values())
+    y_max_best = max(int(cam_bounds[3]) for cam_bounds in bounds.values())
+
+    full_w = x_max_best - x_min_best
+    full_h = y_max_best - y_min_best
+
+    # Largest output scale within the budget
+    scale = 1.0
+    while True:
+      canvas_w = max(1, math.ceil(full_w * scale))
+      canvas_h = max(1, math.ceil(full_h * scale))
+      memory = self._estimate_memory(bounds, canvas_w, canvas_h)
+
+      if (self._memory_budget is None) or (memory <= self._memory_budget):
+        break
+
+      if (scale <= MIN_OUTPUT_SCALE):
+        raise ValueError(f'Canvas of {full_w}x{full_h} needs {memory / 2**20:.1f} MiB at scale {scale:.3f}, '
+                         f'over the budget of {self._memory_budget / 2**20:.1f} MiB')
+
+      scale = max(MIN_OUTPUT_SCALE, scale * min(0.95, math.sqrt(self._memory_budget / memory)))
+
+    if (scale < 1.0):
+      print(f'Output scaled by {scale:.3f} to {canvas_w}x{canvas_h} to fit the memory budget', flush=True)
+
+    telemetry.event('canvas_plan', full_w=full_w, full_h=full_h, canvas_w=canvas_w, canvas_h=canvas_h,
+                    scale=scale, memory=memory, rejected=[cam.image.filename for cam in rejected])
+
+    return {'origin': (x_min_best, y_min_best), 'full_w': full_w, 'full_h': full_h, 'canvas_w': canvas_w,
+            'canvas_h': canvas_h, 'scale': scale, 'memory': memory, 'rejected': rejected}
+
+
+  def _estimate_memory(self, cameras, canvas_w, canvas_h):
+    '''
+    Bytes of the canvas, in memory or in its file, of the tiles being
+    rendered, of the planes warped along with the images and of the
+    remap tables of the warper, at full scale whatever the output one,
+    with the chunks they are built in
+
+    Input:
+    ------
+    cameras: {cam: surface bounds} of the cameras kept
+    '''
+    side = min(self._tile_size or self._blender.tile_size or max(canvas_w, canvas_h), max(canvas_w, canvas_h))
+    num_tiles = math.ceil(canvas_w / side) * math.ceil(canvas_h / side)
+    working = min(self._workers, num_tiles) * (side + 2 * self._blender.margin)**2 * self._blender.bytes_per_pixel
+
+    plane_bytes = 4 if (self._blender.needs_weights or (self._seam_finder is not None)) else 1
+    planes = sum(cam.image.image.shape[0] * cam.image.image.shape[1] * plane_bytes for cam in cameras)
+
+    tables = sum(int(x_max - x_min + 2) * int(y_max - y_min + 2) for (x_min, y_min, x_max, y_max) in cameras.values())
+    tables = tables * self._warper.table_bytes_per_pixel
+    if self._warper.build_bytes_per_pixel:
+      tables += min(self._workers, len(cameras)) * REMAP_CHUNK_PIXELS * self._warper.build_bytes_per_pixel
+
+    return canvas_w * canvas_h * 3 + working + planes + tables
+
+
+  def _scale_rect(self, rect, scale, canvas_w, canvas_h):
+    '''
+    Canvas box at the output scale, grown to whole pixels
+    '''
+    if (scale == 1.0):
+      return rect
+
+    (x0, y0, x1, y1) = rect
+    return (int(x0 * scale), int(y0 * scale), min(math.ceil(x1 * scale), canvas_w), min(math.ceil(y1 * scale), canvas_h))
+
+
+  def _new_canvas(self, canvas_w, canvas_h, reopen=False):
+    '''
+    In memory canvas, or a zero filled np.memmap when tiling. A resumed
+    run reopens the canvas file as is. Without a canvas path the file
+    is a temporary one, held open by the Stitch until close() and
+    removed by the system once closed
+    '''
+    if self._tile_size is None:
+      return np.zeros((canvas_h, canvas_w, 3), dtype=np.uint8)
+
+    if self._canvas_path is None:
+      # A new run replaces the canvas of the previous one
+      self.close()
+      self._canvas_file = TemporaryFile(suffix='.canvas')
+      return np.memmap(self._canvas_file, dtype=np.uint8, mode='w+', shape=(canvas_h, canvas_w, 3))
+
+    mode = 'r+' if reopen else 'w+'
+    return np.memmap(self._canvas_path, dtype=np.uint8, mode=mode, shape=(canvas_h, canvas_w, 3))
+
+
+  def _progress_path(self):
+    if (self._tile_size is None) or (self._canvas_path is None):
+      return None
+
+    return self._canvas_path + '.tiles'
+
+
+  def _render_key(self, out_scale):
+    '''
+    Hash of what the canvas is rendered from: the cameras, the output
+    scale and the settings of the warper, blender, seam finder and gain
+    compensator
+    '''
+    digest = sha1()
+    for cam in self._cameras:
+      digest.update(f'{cam.image.filename} {cam.image.image.shape}'.encode())
+      digest.update(np.float64([cam.focal, cam.ppx, cam.ppy, out_scale]).tobytes())
+      digest.update(np.ascontiguousarray(cam.R, dtype=np.float64).tobytes())
+
+    for part in (self._warper, self._blender, self._seam_finder, self._gain_compensator):
+      settings = vars(part) if part is not None else {}
+      settings = sorted((name, value) for (name, value) in settings.items()
+                        if isinstance(value, (bool, int, float, str, type(None))))
+      digest.update(repr((type(part).__name__, settings)).encode())
+
+    return digest.hexdigest()
+
+
+  def _load_progress(self, canvas_w, canvas_h, render_key):
+    '''
+    Tiles already in the canvas file, when resuming the same canvas,
+    tiling and render key (see _render_key)
+
+    Output:
+    -------
+    Returns the set of finished tiles, None to start a new canvas
+    '''
+    progress_path = self._progress_path()
+    if (not self._resume) or (progress_path is None):
+      return None
+
+    if not (os.path.isfile(progress_path) and os.path.isfile(self._canvas_path)):
+      return None
+
+    with open(progress_path) as progress:
+      lines = progress.read().splitlines()
+
+    if (not lines) or (lines[0] != f'canvas {canvas_w} {canvas_h} {self._tile_size} {render_key}'):
+      return None
+
+    if (os.path.getsize(self._canvas_path) != canvas_w * canvas_h * 3):
+      return None
+
+    return {tuple(int(value) for value in line.split()) for line in lines[1:] if len(line.split()) == 4}
+
+
+  def _start_progress(self, canvas_w, canvas_h, render_key):
+    '''
+    Starts the tile list of a new canvas
+    '''
+    progress_path = self._progress_path()
+    if progress_path is None:
+      return
+
+    with open(progress_path, 'w') as progress:
+      progress.write(f'canvas {canvas_w} {canvas_h} {self._tile_size} {render_key}\n')
+
+
+  def _end_progress(self):
+    '''
+    Removes the tile list of a finished canvas, a later run renders it
+    again
+    '''
+    progress_path = self._progress_path()
+    if (progress_path is not None) and os.path.isfile(progress_path):
+      os.remove(progress_path)
+
+
+  def _save_progress(self, final_img, finished):
+    '''
+    Flushes the canvas, then lists the finished tiles, a tile is never
+    listed before it is on disk
+    '''
+    if not isinstance(final_img, np.memmap):
+      return
+
+    final_img.flush()
+
+    progress_path = self._progress_path()
+    if (progress_path is None) or (not finished):
+      return
+
+    with open(progress_path, 'a') as progress:
+      for tile in finished:
+        progress.write(' '.join(str(value) for value in tile) + '\n')
+
+
+  def _stream_rows(self, final_img, tile_rows, tiles_left, next_row):
+    '''
+    Writes the finished rows of tiles from next_row on, in strips of
+    OUTPUT_STRIP_ROWS
+
+    Output:
+    -------
+    Returns the first row of tiles not written yet
+    '''
+    if self._writer is None:
+      return next_row
+
+    while (next_row < len(tile_rows)) and (tiles_left[tile_rows[next_row][0]] == 0):
+      (y0, y1) = tile_rows[next_row]
+      for y in range(y0, y1, OUTPUT_STRIP_ROWS):
+        self._writer.write(np.asarray(final_img[y:min(y + OUTPUT_STRIP_ROWS, y1)]))
+
+      next_row += 1
+
+    return next_row
+
+
+  def _tiles(self, canvas_w, canvas_h):
+    '''
+    Tiles (x0, y0, x1, y1) covering the canvas row by row
+    '''
+    tile_size = self._tile_size or self._blender.tile_size or max(canvas_w, canvas_h, 1)
+
+    for y0 in range(0, canvas_h, tile_size):
+      for x0 in range(0, canvas_w, tile_size):
+        yield (x0, y0, min(x0 + tile_size, canvas_w), min(y0 + tile_size, canvas_h))
+
+
+  def _intersect(self, roi, tile):
+    x0, y0 = max(roi[0], tile[0]), max(roi[1], tile[1])
+    x1, y1 = min(roi[2], tile[2]), min(roi[3], tile[3])
+
+    if (x0 >= x1 or y0 >= y1):
+      return None
+
+    return (x0, y0, x1, y1)
+
+
+  def _border_distance(self, shape):
+    '''
+    Distance of every pixel to the nearest image border, 1 on the border
+    '''
+    h, w = shape[:2]
+    ys, xs = np.arange(h), np.arange(w)
+    return np.minimum.outer(np.minimum(ys + 1, h - ys), np.minimum(xs + 1, w - xs)).astype(np.float32)
+
+
+  def _low_res_pass(self, rois, warp, canvas_w, canvas_h):
+    '''
+    Warps the cameras onto the canvas downscaled so the median warped
+    image is SEAM_MEGAPIX, and estimates the gains, then the seams of
+    the compensated images there
+
+    Output:
+    -------
+    Returns {cam: (scale, low res rect, gain map or None, seam mask or None)}
+    '''
+    area = np.median([(x1 - x0) * (y1 - y0) for (x0, y0, x1, y1) in rois.values()]) if rois else 1
+    scale = min(1.0, math.sqrt(SEAM_MEGAPIX * 1e6 / max(area, 1)))
+
+    cams = list(rois)
+    parts = []
+    for cam in cams:
+      (x0, y0, x1, y1) = rois[cam]
+      rect = (int(x0 * scale), int(y0 * scale), max(math.ceil(x1 * scale), int(x0 * scale) + 1),
+              max(math.ceil(y1 * scale), int(y0 * scale) + 1))
+
+      image = warp(cam, rect, None, scale)
+      mask = warp(cam, rect, self._weights[cam], scale) > 0
+      parts.append((rect, image, mask))
+
+    gains = [None] * len(cams)
+    if self._gain_compensator is not None:
+      gains = self._gain_compensator.gains(parts)
+      parts = [(rect, np.clip(image * gain[..., None], 0, 255).astype(np.uint8), mask)
+               for ((rect, image, mask), gain) in zip(parts, gains)]
+
+    seams = [None] * len(cams)
+    if (self._seam_finder is not None) and parts:
+      seams = [seam.astype(np.float32) for seam in self._seam_finder.find(parts)]
+
+    return {cam: (scale, part[0], gain, seam) for (cam, part, gain, seam) in zip(cams, parts, gains, seams)}
+
+
+  def _upsample(self, low, scale, low_rect, part):
+    '''
+    Samples a map of the downscaled canvas at the pixels of a full
+    resolution part
+    '''
+    (x0, y0, x1, y1) = part
+    map_x, map_y = np.meshgrid((np.arange(x0, x1, dtype=np.float32) + 0.5) * scale - 0.5 - low_rect[0],
+                               (np.arange(y0, y1, dtype=np.float32) + 0.5) * scale - 0.5 - low_rect[1])
+
+    return cv.remap(low, map_x, map_y, cv.INTER_LINEAR, borderMode=cv.BORDER_REPLICATE)
+
+
+  def _render_tiles(self, tiles, rois, warp, pool):
+    '''
+    Renders the tiles on the pool, in batches so only a few finished
+    tiles wait to be written. A single tile warps its cameras on the
+    pool instead
+
+    Output:
+    -------
+    Yields (tile, tile image) in the tile order
+    '''
+    if (len(tiles) == 1):
+      yield (tiles[0], self._render_tile(tiles[0], rois, warp, pool))
+      return
+
+    batch = 2 * self._workers
+    for start in range(0, len(tiles), batch):
+      batch_tiles = tiles[start:start + batch]
+      yield from zip(batch_tiles, pool.map(lambda tile: self._render_tile(tile, rois, warp), batch_tiles))
+
+
+  def _render_tile(self, tile, rois, warp, pool=None):
+    '''
+    Composites the cameras intersecting a tile grown by the blender
+    margin, their warps run on the pool when one is given
+
+    Output:
+    -------
+    Returns the tile image
+    '''
+    (tx0, ty0, tx1, ty1) = tile
+    margin = self._blender.margin
+    rect = (tx0 - margin, ty0 - margin, tx1 + margin, ty1 + margin)
+
+    parts = []
+    for (cam, roi) in rois.items():
+      part = self._intersect(roi, rect)
+      if part is not None:
+        parts.append((cam, part))
+
+    def warp_part(entry):
+      (cam, part) = entry
+      image = warp(cam, part)
+      weight = warp(cam, part, self._weights[cam])
+
+      # Pixels mostly outside the image are not covered, as for the mask of ones
+      weight[weight < 0.5] = 0
+
+      if cam in self._low_res:
+        (scale, low_rect, gain, seam) = self._low_res[cam]
+        if gain is not None:
+          image = np.clip(image * self._upsample(gain, scale, low_rect, part)[..., None], 0, 255).astype(np.uint8)
+
+        # Nothing past the seam
+        if seam is not None:
+          weight = weight * (self._upsample(seam, scale, low_rect, part) > 0.5)
+
+      return (cam, part, image, weight)
+
+    results = pool.map(warp_part, parts) if pool is not None else map(warp_part, parts)
+
+    # Blended in the camera order, the pixels no image covers are background
+    (tile_img, coverage) = self._blender.blend(rect, list(results))
+    tile_img = tile_img[margin:margin + ty1 - ty0, margin:margin + tx1 - tx0]
+
+    tile_img[~coverage[margin:margin + ty1 - ty0, margin:margin + tx1 - tx0]] = 255
+    return tile_img
+
+
   def _get_identity_cam(self):
     identity_cam = None
     for cam in self._cameras:
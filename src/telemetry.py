@@ -0,0 +1,143 @@
+module_name = 'Telemetry'
+
+'''
+Version: v1.0.0
+
+Description:
+    Structured events of the RANSAC and bundle adjustment stages,
+    written as JSON lines, one object per event:
+
+        {"time": 0.0123, "event": "lm_iteration", "rms": 0.71, ...}
+
+    Telemetry is off until enable() is called. While it is off,
+    event() and the timed() wrappers return right away, and hot loops
+    check enabled() before computing anything they would report.
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    https://jsonlines.org
+
+Notes:
+    Events can come from the BA trial-step threads, writes are locked.
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+
+# OTHER IMPORTS
+from functools import wraps
+from json      import dumps
+from threading import Lock
+from time      import perf_counter
+
+# USER INTERFACE
+_sink  = None
+_owns  = False
+_start = 0.0
+_lock  = Lock()
+
+
+def enable(sink):
+    '''
+    Starts writing events
+
+    Input:
+    ------
+    sink: path of the JSON lines file (appended to) or an open text stream
+    '''
+    global _sink, _owns, _start
+
+    disable()
+    if isinstance(sink, str):
+        _sink, _owns = open(sink, 'a'), True
+    else:
+        _sink, _owns = sink, False
+    # if
+    _start = perf_counter()
+#
+
+
+def disable():
+    '''
+    Stops writing events and closes the file opened by enable
+    '''
+    global _sink, _owns
+
+    with _lock:
+        if _owns:
+            _sink.close()
+        # if
+        _sink, _owns = None, False
+    # with
+#
+
+
+def enabled():
+    return _sink is not None
+#
+
+
+def _json_value(value):
+    # NumPy scalars and arrays
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    # if
+    return str(value)
+#
+
+
+def event(name, **fields):
+    '''
+    Writes one event
+
+    Input:
+    ------
+    name  : event name
+    fields: JSON serialisable values, NumPy values are converted
+    '''
+    if _sink is None:
+        return
+    # if
+
+    record = {'time': perf_counter() - _start, 'event': name}
+    record.update(fields)
+    line   = dumps(record, default=_json_value)
+
+    with _lock:
+        if _sink is not None:
+            _sink.write(line + '\n')
+        # if
+    # with
+#
+
+
+def timed(stage):
+    '''
+    Decorator writing a 'stage' event with the wall time of each call
+
+    Input:
+    ------
+    stage: name of the stage, e.g. 'jacobian', 'solve', 'residual'
+    '''
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _sink is None:
+                return func(*args, **kwargs)
+            # if
+
+            start  = perf_counter()
+            result = func(*args, **kwargs)
+            event('stage', stage=stage, seconds=perf_counter() - start)
+            return result
+        #
+        return wrapper
+    #
+    return decorate
+#
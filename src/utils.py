@@ -29,6 +29,59 @@ PARAMS_PER_POINT_MATCHES = 2
 PARAMS_PER_CAMERA        = 6
 REGULARISATION_PARAM     = 5
 MAX_ITR                  = 50
+SPARSE_PCG_MIN_CAMERAS   = 100
+PCG_TOLERANCE            = 1e-10
+PCG_MAX_ITR              = 500
+LM_INITIAL_DAMPING       = 1e-3
+LM_MAX_DAMPING           = 1e12
+LM_GRADIENT_TOL          = 1e-8
+LM_STEP_TOL              = 1e-10
+LM_COST_TOL              = 1e-9
+INCREMENTAL_BA           = True
+LOCAL_BA_MAX_ITR         = 5
+FULL_BA_INTERVAL         = 10
+BA_MAX_POINTS_PER_MATCH  = 400
+BA_SAMPLING_SEED         = 0
+RANSAC_SEED              = 0
+BA_FINAL_POLISH          = False
+SCIPY_NFEV_PER_ITR       = 4
+SCIPY_LSMR_TOL           = 1e-14
+SCIPY_LSMR_MAX_ITR       = 2000
+USE_NUMBA                = True
+LM_NUM_TRIALS            = 1
+LM_TRIAL_DAMPING_STEP    = 10.0
+BA_TRIAL_WORKERS         = None
+TELEMETRY_PATH           = None
+COMPONENT_WORKERS        = None
+CAMERA_STORE_DIR         = './camera_store'
+CAMERA_STORE_MAX_ENTRIES = 16
+PER_CAMERA_FOCAL         = False
+STITCH_TILE_SIZE         = None
+STITCH_CANVAS_PATH       = None
+STITCH_WORKERS           = None
+STITCH_PROJECTION        = 'planar'
+REMAP_CACHE_DIR          = './remap_cache'
+WARPER_BORDER_SAMPLES    = 256
+REMAP_CHUNK_PIXELS       = 2**18
+BLEND_MODE               = 'overwrite'
+BLEND_BANDS              = 5
+BLEND_TILE_SIZE          = 1024
+SEAM_FINDER              = None
+GAIN_COMPENSATION        = None
+SEAM_MEGAPIX             = 0.1
+GAIN_BLOCK_SIZE          = 32
+PREVIEW_MEGAPIX          = 0.3
+RENDER_JOB_DIR           = './render_job'
+RENDER_TILE_SIZE         = 1024
+STITCH_MEMORY_BUDGET     = 4 * 2**30
+CAMERA_EXTENT_OUTLIER    = 8.0
+MIN_OUTPUT_SCALE         = 0.1
+OUTPUT_FORMAT            = 'png'
+OUTPUT_STRIP_ROWS        = 256
+PNG_COMPRESSION          = 1
+DZI_TILE_SIZE            = 254
+DZI_OVERLAP              = 1
+DZI_QUALITY              = 90
 FOCAL_DERIVATIVE         = array([[1,0,0],
                                   [0,1,0],
                                   [0,0,0]])
@@ -41,3 +94,4 @@ PPY_DERIVATIVE           = array([[0,0,0],
                                   [0,0,1],
                                   [0,0,0]])
 
+INTRINSIC_DERIVATIVES    = array([FOCAL_DERIVATIVE, PPX_DERIVATIVE, PPY_DERIVATIVE])
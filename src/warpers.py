@@ -0,0 +1,434 @@
+module_name = 'Warpers'
+
+'''
+Version: v1.0.0
+
+Description:
+    Compositing surfaces of the panorama. A warper places the images
+    of the cameras on its surface, seen from the reference (identity)
+    camera:
+
+        planar_warper     : plane of the reference camera,
+                            x_ref = K_ref R_ref R^T K^-1 x
+        cylindrical_warper: cylinder about the vertical axis of the
+                            reference camera
+        spherical_warper  : sphere about the reference camera
+
+    Planar corners shoot toward infinity on wide sweeps, the cylinder
+    and the sphere keep the canvas bounded. Their warps use cv.remap
+    lookup tables, computed once per camera and cached on disk keyed
+    by the camera params and the output scale.
+
+    Every warper has the same interface:
+
+        bounds(cam, ref_cam)                       : extent of the image on the surface,
+                                                     None if it has none
+        roi(cam, ref_cam, origin, canvas_w, canvas_h): canvas box the image can write to
+        warp(cam, ref_cam, origin, rect, image, scale): image warped into a canvas box,
+                                                        image defaults to the camera image
+
+    With a scale below 1 the warp renders a downscaled canvas, pixel
+    centres aligned like cv.resize: pixel X of the full canvas lands at
+    (X + 0.5) * scale - 0.5. The seams and the gains are estimated on
+    such a copy, and the output is rendered on one when the canvas is
+    over the memory budget.
+
+Authors:
+    Iphy Kelvin
+
+Date Created     : 10/19/2026
+Date Last Updated: 10/19/2026
+
+Doc:
+    Szeliski: Image Alignment and Stitching, a tutorial (2006), 2.3
+
+Notes:
+    Surface coordinates are scale * angle, the scale defaults to the
+    focal of the reference camera so its centre keeps the planar
+    resolution. The cylinder seam is behind the reference camera, a
+    sweep of more than 360 degrees wraps around.
+
+ToDo:
+'''
+
+# CUSTOM IMPORTS
+
+# OTHER IMPORTS
+import cv2   as cv
+import numpy as np
+from abc       import ABC, abstractmethod
+from hashlib   import sha1
+from os        import makedirs, path, replace
+from threading import Lock
+from utils     import REMAP_CACHE_DIR, WARPER_BORDER_SAMPLES, REMAP_CHUNK_PIXELS
+
+# USER INTERFACE
+
+
+def _translation(x_shift, y_shift):
+    return np.array([
+        [1, 0, x_shift],
+        [0, 1, y_shift],
+        [0, 0, 1]], dtype=np.float64)
+#
+
+
+def _scaling(x_scale, y_scale):
+    '''
+    Resize of the pixel grid, pixel centres aligned like cv.resize
+    '''
+    return np.array([
+        [x_scale, 0, 0.5 * (x_scale - 1)],
+        [0, y_scale, 0.5 * (y_scale - 1)],
+        [0, 0, 1]], dtype=np.float64)
+#
+
+
+def _downscale(image, scale):
+    '''
+    Image resized by scale, with the exact x and y ratios of the resize
+
+    Output:
+    -------
+    Returns the resized image, x ratio and y ratio (small / full)
+    '''
+    h, w   = image.shape[:2]
+    sw, sh = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+    return cv.resize(image, (sw, sh), interpolation=cv.INTER_AREA), sw / w, sh / h
+#
+
+
+def _clip_roi(pts, origin, canvas_w, canvas_h):
+    '''
+    Canvas box of surface points, clipped to the canvas
+
+    Output:
+    -------
+    Returns (x0, y0, x1, y1) or None when it misses the canvas
+    '''
+    [x0, y0] = np.maximum(np.floor(pts.min(axis=0) - origin).astype(int), 0)
+    [x1, y1] = np.minimum(np.ceil(pts.max(axis=0) - origin).astype(int) + 1, [canvas_w, canvas_h])
+
+    if (x0 >= x1 or y0 >= y1):
+        return None
+    # if
+    return (x0, y0, x1, y1)
+#
+
+
+class planar_warper:
+    '''
+    Homography onto the plane of the reference camera
+    '''
+    name                  = 'planar'
+    table_bytes_per_pixel = 0       # No lookup tables
+    build_bytes_per_pixel = 0
+
+    def _H(self, cam, ref_cam):
+        return ref_cam.KR @ cam.KR_inv
+    #
+
+    def bounds(self, cam, ref_cam):
+        '''
+        Output:
+        -------
+        Returns None when a corner falls behind the reference camera
+        or out of the int32 range, the image has no extent on the plane
+        '''
+        h, w = cam.image.image.shape[:2]
+
+        pts = np.float32([[0,0],[0,h],[w,h],[w,0]]).reshape(-1,1,2)
+        if np.any(np.hstack([pts.reshape(-1,2), np.ones((4,1))]) @ self._H(cam, ref_cam)[2] <= 0):
+            return None
+        # if
+
+        transformed_corners = cv.perspectiveTransform(pts, self._H(cam, ref_cam))
+        if not np.all(np.abs(transformed_corners) < 2**30):
+            return None
+        # if
+
+        [x_min, y_min] = np.int32(transformed_corners.min(axis=0).ravel())
+        [x_max, y_max] = np.int32(transformed_corners.max(axis=0).ravel())
+        return (x_min, y_min, x_max, y_max)
+    #
+
+    def roi(self, cam, ref_cam, origin, canvas_w, canvas_h):
+        '''
+        The corners are pushed out by a pixel so the interpolated edge
+        pixels are kept
+        '''
+        h, w = cam.image.image.shape[:2]
+
+        pts = np.float32([[-1,-1],[-1,h],[w,h],[w,-1]]).reshape(-1,1,2)
+        H   = _translation(-origin[0], -origin[1]) @ self._H(cam, ref_cam)
+        return _clip_roi(cv.perspectiveTransform(pts, H).reshape(-1,2), (0, 0), canvas_w, canvas_h)
+    #
+
+    def warp(self, cam, ref_cam, origin, rect, image=None, scale=1.0):
+        (x0, y0, x1, y1) = rect
+        image = cam.image.image if image is None else image
+
+        H = _translation(-x0, -y0) @ _scaling(scale, scale) @ _translation(-origin[0], -origin[1]) @ self._H(cam, ref_cam)
+        if scale != 1.0:
+            image, x_ratio, y_ratio = _downscale(image, scale)
+            H = H @ _scaling(1 / x_ratio, 1 / y_ratio)
+        # if
+        return cv.warpPerspective(image, H, (x1 - x0, y1 - y0))
+    #
+
+
+class surface_warper(ABC):
+    '''
+    Base of the curved surfaces. Subclasses map the rays of the
+    reference camera frame to surface coordinates and back
+    '''
+    name                  = None
+    table_bytes_per_pixel = 8       # float32 (x, y) per surface pixel of a camera
+    build_bytes_per_pixel = 96      # float64 temporaries per pixel of a chunk, estimate
+
+    def __init__(self, scale=None, cache_dir=REMAP_CACHE_DIR):
+        '''
+        Input:
+        ------
+        scale    : surface pixels per radian, the reference focal when None
+        cache_dir: directory of the lookup tables, None keeps them in memory only
+        '''
+        self._scale     = scale
+        self._cache_dir = cache_dir
+        self._maps      = {}
+        self._key_locks = {}
+        self._lock      = Lock()
+    #
+
+    def _surface_scale(self, ref_cam):
+        return float(self._scale or ref_cam.focal)
+    #
+
+    @abstractmethod
+    def _rays_to_surface(self, rays, scale):
+        '''
+        (N, 3) rays of the reference camera frame to (N, 2) surface coordinates
+        '''
+    #
+
+    @abstractmethod
+    def _surface_to_rays(self, u, v, scale):
+        '''
+        Surface coordinates (arrays of any shape) to rays, (..., 3)
+        '''
+    #
+
+    def _border_points(self, shape, pad):
+        '''
+        Points along the border of the image, pushed out by pad pixels
+        '''
+        h, w = shape[:2]
+        xs   = np.linspace(-pad, w + pad, WARPER_BORDER_SAMPLES)
+        ys   = np.linspace(-pad, h + pad, WARPER_BORDER_SAMPLES)
+
+        return np.concatenate([np.stack([xs, np.full_like(xs, -pad)], axis=1),
+                               np.stack([xs, np.full_like(xs, h + pad)], axis=1),
+                               np.stack([np.full_like(ys, -pad), ys], axis=1),
+                               np.stack([np.full_like(ys, w + pad), ys], axis=1)])
+    #
+
+    def _project(self, cam, ref_cam, pts):
+        '''
+        Image points of cam to surface coordinates
+        '''
+        homo = np.hstack([pts, np.ones((len(pts), 1))])
+        rays = homo @ (ref_cam.R @ cam.KR_inv).T
+        return self._rays_to_surface(rays, self._surface_scale(ref_cam))
+    #
+
+    def bounds(self, cam, ref_cam):
+        surface = self._project(cam, ref_cam, self._border_points(cam.image.image.shape, 0))
+
+        [x_min, y_min] = np.floor(surface.min(axis=0)).astype(int)
+        [x_max, y_max] = np.ceil(surface.max(axis=0)).astype(int)
+        return (x_min, y_min, x_max, y_max)
+    #
+
+    def _surface_box(self, cam, ref_cam):
+        '''
+        Box of the surface the image can write to, in surface coordinates
+        '''
+        surface = self._project(cam, ref_cam, self._border_points(cam.image.image.shape, 1))
+
+        [x0, y0] = np.floor(surface.min(axis=0)).astype(int)
+        [x1, y1] = np.ceil(surface.max(axis=0)).astype(int) + 1
+        return (x0, y0, x1, y1)
+    #
+
+    def roi(self, cam, ref_cam, origin, canvas_w, canvas_h):
+        (x0, y0, x1, y1) = self._surface_box(cam, ref_cam)
+        return _clip_roi(np.array([[x0, y0], [x1 - 1, y1 - 1]]), origin, canvas_w, canvas_h)
+    #
+
+    def _cache_key(self, cam, ref_cam, box):
+        digest = sha1(self.name.encode())
+        digest.update(np.float64(self._surface_scale(ref_cam)).tobytes())
+        for matrix in (cam.K, cam.R, ref_cam.R):
+            digest.update(np.ascontiguousarray(matrix, dtype=np.float64).tobytes())
+        # for
+        digest.update(np.array(cam.image.image.shape[:2] + box, dtype=np.int64).tobytes())
+        return digest.hexdigest()
+    #
+
+    def _compute_maps(self, cam, ref_cam, box, maps):
+        '''
+        Image coordinates of cam of every surface pixel of the box,
+        -1 where the ray points away from the camera. Computed in
+        chunks of rows of about REMAP_CHUNK_PIXELS, the float64
+        temporaries never span the whole box
+
+        Input:
+        ------
+        maps: (H, W, 2) float32 table of the box, filled in place
+        '''
+        (x0, y0, x1, y1) = box
+        scale  = self._surface_scale(ref_cam)
+        matrix = (cam.KR @ ref_cam.R.T).T
+        step   = max(1, REMAP_CHUNK_PIXELS // max(x1 - x0, 1))
+
+        for row in range(y0, y1, step):
+            v, u = np.mgrid[row:min(row + step, y1), x0:x1].astype(np.float64)
+            img  = self._surface_to_rays(u, v, scale) @ matrix
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                chunk = img[..., :2] / img[..., 2:]
+            # with
+            chunk[img[..., 2] <= 0] = -1
+            maps[row - y0:row - y0 + len(chunk)] = chunk
+        # for
+    #
+
+    def lookup_table(self, cam, ref_cam):
+        '''
+        Remap table of cam over its surface box, from memory, the disk
+        cache or computed. Cached tables are memory mapped, only those
+        of a warper without cache directory are held in memory
+
+        Output:
+        -------
+        Returns the (H, W, 2) table and the surface box (x0, y0, x1, y1)
+        '''
+        box = self._surface_box(cam, ref_cam)
+        key = self._cache_key(cam, ref_cam, box)
+
+        # One lock per table, the cameras are warped from several threads
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, Lock())
+        # with
+
+        with key_lock:
+            if key in self._maps:
+                return self._maps[key], box
+            # if
+
+            (x0, y0, x1, y1) = box
+            shape = (int(y1 - y0), int(x1 - x0), 2)
+
+            if self._cache_dir is None:
+                maps = np.empty(shape, dtype=np.float32)
+                self._compute_maps(cam, ref_cam, box, maps)
+            else:
+                # Computed straight into the file, then memory mapped
+                # like a table from an earlier run
+                cache_path = path.join(self._cache_dir, f'remap_{key}.npy')
+                if not path.isfile(cache_path):
+                    makedirs(self._cache_dir, exist_ok=True)
+                    table = np.lib.format.open_memmap(cache_path + '.tmp', mode='w+', dtype=np.float32, shape=shape)
+                    self._compute_maps(cam, ref_cam, box, table)
+                    table.flush()
+                    del table
+                    replace(cache_path + '.tmp', cache_path)
+                # if
+                maps = np.load(cache_path, mmap_mode='r')
+            # if
+            self._maps[key] = maps
+        # with
+        return maps, box
+    #
+
+    def warp(self, cam, ref_cam, origin, rect, image=None, scale=1.0):
+        (x0, y0, x1, y1) = rect
+        image = cam.image.image if image is None else image
+        maps, box = self.lookup_table(cam, ref_cam)
+
+        if scale != 1.0:
+            # Nearest table entries of the downscaled canvas pixels
+            rows = np.round((np.arange(y0, y1) + 0.5) / scale - 0.5) + origin[1] - box[1]
+            cols = np.round((np.arange(x0, x1) + 0.5) / scale - 0.5) + origin[0] - box[0]
+            rows = np.clip(rows, 0, len(maps) - 1).astype(int)
+            cols = np.clip(cols, 0, maps.shape[1] - 1).astype(int)
+
+            image, x_ratio, y_ratio = _downscale(image, scale)
+            ratio = np.float32([x_ratio, y_ratio])
+            part  = maps[rows][:, cols]
+            part  = np.where(part == -1, np.float32(-1), (part + 0.5) * ratio - 0.5)
+            return cv.remap(image, part, None, cv.INTER_LINEAR, borderMode=cv.BORDER_CONSTANT)
+        # if
+
+        # Rect in the table of the camera
+        col0 = x0 + origin[0] - box[0]
+        row0 = y0 + origin[1] - box[1]
+        part = np.ascontiguousarray(maps[row0:row0 + (y1 - y0), col0:col0 + (x1 - x0)])
+
+        return cv.remap(image, part, None, cv.INTER_LINEAR, borderMode=cv.BORDER_CONSTANT)
+    #
+
+
+class cylindrical_warper(surface_warper):
+    '''
+    u = s * atan2(x, z), v = s * y / sqrt(x^2 + z^2)
+    '''
+    name = 'cylindrical'
+
+    def _rays_to_surface(self, rays, scale):
+        x, y, z = rays[:, 0], rays[:, 1], rays[:, 2]
+        return scale * np.stack([np.arctan2(x, z), y / np.hypot(x, z)], axis=1)
+    #
+
+    def _surface_to_rays(self, u, v, scale):
+        theta = u / scale
+        return np.stack([np.sin(theta), v / scale, np.cos(theta)], axis=-1)
+    #
+
+
+class spherical_warper(surface_warper):
+    '''
+    u = s * atan2(x, z), v = s * atan2(y, sqrt(x^2 + z^2))
+    '''
+    name = 'spherical'
+
+    def _rays_to_surface(self, rays, scale):
+        x, y, z = rays[:, 0], rays[:, 1], rays[:, 2]
+        return scale * np.stack([np.arctan2(x, z), np.arctan2(y, np.hypot(x, z))], axis=1)
+    #
+
+    def _surface_to_rays(self, u, v, scale):
+        theta, phi = u / scale, v / scale
+        return np.stack([np.sin(theta) * np.cos(phi), np.sin(phi), np.cos(theta) * np.cos(phi)], axis=-1)
+    #
+
+
+WARPERS = {warper.name: warper for warper in (planar_warper, cylindrical_warper, spherical_warper)}
+
+
+def make_warper(projection, **kwargs):
+    '''
+    Input:
+    ------
+    projection: 'planar', 'cylindrical' or 'spherical'
+    kwargs    : scale and cache_dir of the curved surfaces
+    '''
+    if projection not in WARPERS:
+        raise ValueError(f'Unknown projection {projection}, expected one of {sorted(WARPERS)}')
+    # if
+
+    if projection == 'planar':
+        return planar_warper()
+    # if
+    return WARPERS[projection](**kwargs)
+#
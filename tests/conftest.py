@@ -0,0 +1,63 @@
+# The modules of src import each other by bare name
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import cv2   as cv
+import numpy as np
+import pytest
+from scipy.spatial.transform import Rotation
+
+from camera import Camera
+
+
+class synthetic_image:
+    '''
+    Stands in for the sift_descriptor of an image, the cameras only
+    read its filename and pixels
+    '''
+
+    def __init__(self, filename, image):
+        self.filename = filename
+        self.image    = image
+    #
+
+
+def make_views(num_views=4, w=160, h=120, focal=150.0, yaw=0.35, seed=0):
+    '''
+    Views of a textured plane from cameras rotating about the vertical
+    axis, the second one the identity camera
+
+    Output:
+    -------
+    Returns the cameras, with their exact focal, principal point and R
+    '''
+    rng   = np.random.default_rng(seed)
+    world = rng.integers(0, 256, (h * 2 // 8, w * 4 // 8, 3), dtype=np.uint8)
+    world = cv.GaussianBlur(cv.resize(world, (w * 4, h * 2), interpolation=cv.INTER_CUBIC), (5, 5), 0)
+
+    # The world plane, shifted so the identity view sees its middle
+    T = np.array([[1, 0, -w * 1.5], [0, 1, -h * 0.5], [0, 0, 1]], dtype=np.float64)
+    K = np.array([[focal, 0, w / 2], [0, focal, h / 2], [0, 0, 1]], dtype=np.float64)
+
+    cameras = []
+    for view in range(num_views):
+        R = np.eye(3) if view == 1 else Rotation.from_euler('y', yaw * (view - 1)).as_matrix()
+        image = cv.warpPerspective(world, K @ R @ np.linalg.inv(K) @ T, (w, h))
+
+        cam       = Camera(synthetic_image(f'v{view}.png', image))
+        cam.focal = focal
+        cam.ppx   = w / 2
+        cam.ppy   = h / 2
+        cam.R     = R
+        cameras.append(cam)
+    # for
+    return cameras
+#
+
+
+@pytest.fixture
+def views():
+    return make_views()
+#
@@ -0,0 +1,61 @@
+'''
+camera_store checkpoints: the params of the cameras saved, restored
+by load, and the least recently used pruned
+'''
+
+import os
+
+from numpy import eye, allclose
+
+from camera_store import camera_store
+
+
+def test_save_load(tmp_path, views):
+    store = camera_store(str(tmp_path))
+    store.save('a', views)
+
+    expected = [(cam.focal, cam.ppx, cam.ppy, cam.R.copy()) for cam in views]
+    for cam in views:
+        cam.focal, cam.ppx, cam.ppy, cam.R = 1.0, 0.0, 0.0, eye(3)
+    # for
+
+    # The stored order is by filename, the cameras come in any order
+    assert store.load('a', views[::-1])
+    for (cam, (focal, ppx, ppy, R)) in zip(views, expected):
+        assert allclose([cam.focal, cam.ppx, cam.ppy], [focal, ppx, ppy])
+        assert allclose(cam.R, R)
+    # for
+    assert store.filenames('a') == sorted(cam.image.filename for cam in views)
+#
+
+
+def test_load_other_images(tmp_path, views):
+    store = camera_store(str(tmp_path))
+    store.save('a', views[:3])
+
+    focal = views[0].focal
+    views[0].focal = 1.0
+    assert not store.load('a', views)
+    assert views[0].focal == 1.0
+    views[0].focal = focal
+
+    assert not store.load('missing', views)
+    assert store.filenames('missing') is None
+#
+
+
+def test_prune(tmp_path, views):
+    store = camera_store(str(tmp_path), max_entries=2)
+    for (age, key) in enumerate(['old', 'mid', 'new']):
+        store.save(key, views)
+        os.utime(os.path.join(tmp_path, f'cameras_{key}.npz'), (1000 + age, 1000 + age))
+    # for
+
+    # Loading the oldest makes it the most recently used
+    assert store.load('old', views)
+    store.prune()
+    assert sorted(os.listdir(tmp_path)) == ['cameras_new.npz', 'cameras_old.npz']
+
+    camera_store(str(tmp_path), max_entries=None).prune()
+    assert len(os.listdir(tmp_path)) == 2
+#
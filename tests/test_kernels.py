@@ -0,0 +1,95 @@
+'''
+NumPy and Numba kernels against a scalar reference, one point at a
+time. The Numba tests are skipped when Numba is not installed.
+'''
+
+import pytest
+from numpy import zeros, hstack, power, allclose
+from numpy.random import default_rng
+
+import kernels
+
+NUM_PTS    = 500
+NUM_PARAMS = 12
+
+requires_numba = pytest.mark.skipif(not kernels.NUMBA_AVAILABLE, reason='numba is not installed')
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng  = default_rng(0)
+    pts1 = rng.uniform(-500, 500, (NUM_PTS, 2))
+    pts2 = rng.uniform(-500, 500, (NUM_PTS, 2))
+    H    = rng.normal(0, 1, (3, 3))
+    H   /= H[2, 2]
+    dhdv = rng.normal(0, 1, (NUM_PARAMS, NUM_PTS, 3))
+    homo = rng.normal(0, 1, (NUM_PTS, 3))
+    homo[:, 2] += 5
+
+    # Scalar reference
+    errors = zeros(NUM_PTS)
+    A      = []
+    dE     = zeros((NUM_PARAMS, NUM_PTS, 2))
+    for i in range(NUM_PTS):
+        (x, y), (x_prime, y_prime) = pts1[i], pts2[i]
+        errors[i] = sum(power(hstack([pts2[i], [1]]) - H @ hstack([pts1[i], [1]]), 2))
+        A.append([0, 0, 0, -x, -y, -1, y_prime * x, y_prime * y, y_prime])
+        A.append([x, y, 1, 0, 0, 0, -x_prime * x, -x_prime * y, -x_prime])
+
+        for p in range(NUM_PARAMS):
+            dE[p, i] = [-dhdv[p, i, 0] / homo[i, 2] + dhdv[p, i, 2] * homo[i, 0] / homo[i, 2]**2,
+                        -dhdv[p, i, 1] / homo[i, 2] + dhdv[p, i, 2] * homo[i, 1] / homo[i, 2]**2]
+        # for
+    # for
+
+    return {'pts1': pts1, 'pts2': pts2, 'H': H, 'dhdv': dhdv, 'homo': homo,
+            'errors': errors, 'A': A, 'dE': dE}
+#
+
+
+def test_numpy_projected_errors(data):
+    assert allclose(kernels._projected_errors_numpy(data['pts1'], data['pts2'], data['H']), data['errors'])
+#
+
+
+def test_numpy_compute_A_matrix(data):
+    assert allclose(kernels._compute_A_matrix_numpy(data['pts1'], data['pts2']), data['A'])
+#
+
+
+def test_numpy_dH_homo_coord(data):
+    assert allclose(kernels._dH_homo_coord_numpy(data['dhdv'], data['homo']), data['dE'])
+#
+
+
+@requires_numba
+def test_numba_projected_errors(data):
+    assert allclose(kernels._projected_errors_numba(data['pts1'], data['pts2'], data['H']), data['errors'])
+#
+
+
+@requires_numba
+def test_numba_compute_A_matrix(data):
+    assert allclose(kernels._compute_A_matrix_numba(data['pts1'], data['pts2']), data['A'])
+#
+
+
+@requires_numba
+def test_numba_dH_homo_coord(data):
+    assert allclose(kernels._dH_homo_coord_numba(data['dhdv'], data['homo']), data['dE'])
+#
+
+
+@pytest.mark.parametrize('use_numba', [False, pytest.param(True, marks=requires_numba)])
+def test_public_kernels(data, monkeypatch, use_numba):
+    '''
+    The public functions on either path, from non contiguous input
+    '''
+    monkeypatch.setattr(kernels, 'USE_NUMBA', use_numba)
+    assert kernels._use_numba() == use_numba
+
+    pts1 = data['pts1'].T.copy().T
+    assert allclose(kernels.projected_errors(pts1, data['pts2'], data['H']), data['errors'])
+    assert allclose(kernels.compute_A_matrix(pts1, data['pts2']), data['A'])
+    assert allclose(kernels.dH_homo_coord(data['dhdv'], data['homo']), data['dE'])
+#
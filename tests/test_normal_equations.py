@@ -0,0 +1,99 @@
+'''
+normal_equations.solve against a dense solve of the same system, on
+the direct (spsolve) and the PCG paths, including the fallback of an
+unconverged PCG
+'''
+
+import io
+import json
+
+import pytest
+from numpy import zeros, diag, allclose
+from numpy.linalg import solve
+from numpy.random import default_rng
+
+import normal_equations
+import telemetry
+from utils import PARAMS_PER_CAMERA
+
+NUM_CAMS = 5
+
+
+@pytest.fixture
+def system():
+    '''
+    Normal equations of a chain of random matches, with the dense JtJ
+    and J^T r they should hold
+    '''
+    rng  = default_rng(0)
+    size = NUM_CAMS * PARAMS_PER_CAMERA
+    ne   = normal_equations.normal_equations(NUM_CAMS)
+
+    J_dense = []
+    r_dense = []
+    for (from_id, to_id) in [(0, 1), (1, 2), (2, 3), (3, 4), (0, 2), (1, 4)]:
+        J_match   = rng.normal(0, 1, (40, 2 * PARAMS_PER_CAMERA))
+        residuals = rng.normal(0, 1, (40))
+        ne.add_match(from_id, to_id, J_match, residuals)
+
+        J = zeros((40, size))
+        J[:, from_id*PARAMS_PER_CAMERA:(from_id+1)*PARAMS_PER_CAMERA] = J_match[:, :PARAMS_PER_CAMERA]
+        J[:, to_id*PARAMS_PER_CAMERA:(to_id+1)*PARAMS_PER_CAMERA]     = J_match[:, PARAMS_PER_CAMERA:]
+        J_dense.append(J)
+        r_dense.append(residuals)
+    # for
+
+    J = sum(J.T @ J for J in J_dense)
+    g = sum(J.T @ r for (J, r) in zip(J_dense, r_dense))
+    return ne, J, g
+#
+
+
+def dense_solve(JtJ, Jtr, damping, fixed):
+    '''
+    Reference: fixed params removed, their update zero
+    '''
+    free   = ~fixed
+    result = zeros(len(Jtr))
+    result[free] = solve((JtJ + diag(damping))[free][:, free], Jtr[free])
+    return result
+#
+
+
+@pytest.mark.parametrize('use_pcg', [False, True])
+def test_solve_matches_dense(system, monkeypatch, use_pcg):
+    (ne, JtJ, Jtr) = system
+    monkeypatch.setattr(normal_equations, 'SPARSE_PCG_MIN_CAMERAS', 0 if use_pcg else NUM_CAMS + 1)
+
+    damping = default_rng(1).uniform(0.1, 1.0, (len(Jtr)))
+    fixed   = zeros((len(Jtr)), dtype=bool)
+    fixed[:PARAMS_PER_CAMERA] = True
+
+    assert allclose(ne.JtJ().toarray(), JtJ)
+    assert allclose(ne.Jtr, Jtr)
+
+    step = ne.solve(damping, fixed)
+    assert allclose(step, dense_solve(JtJ, Jtr, damping, fixed), atol=1e-8)
+    assert not step[:PARAMS_PER_CAMERA].any()
+#
+
+
+def test_unconverged_pcg_falls_back(system, monkeypatch):
+    (ne, JtJ, Jtr) = system
+    monkeypatch.setattr(normal_equations, 'SPARSE_PCG_MIN_CAMERAS', 0)
+    monkeypatch.setattr(normal_equations, 'PCG_MAX_ITR', 1)
+
+    damping = zeros((len(Jtr))) + 1e-3
+    fixed   = zeros((len(Jtr)), dtype=bool)
+
+    sink = io.StringIO()
+    telemetry.enable(sink)
+    try:
+        step = ne.solve(damping, fixed)
+    finally:
+        telemetry.disable()
+    # try
+
+    assert allclose(step, dense_solve(JtJ, Jtr, damping, fixed), atol=1e-8)
+    assert 'pcg_fallback' in [json.loads(line)['event'] for line in sink.getvalue().splitlines()]
+#
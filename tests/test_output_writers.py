@@ -0,0 +1,63 @@
+'''
+Output writers against the canvas they were streamed
+'''
+
+import os
+
+import cv2 as cv
+import pytest
+from numpy import asarray, array_equal
+from numpy.random import default_rng
+
+from output_writers import make_output_writer
+from stitch_image   import Stitch
+
+
+@pytest.mark.parametrize('tile_size', [None, 64])
+def test_png_matches_canvas(tmp_path, views, tile_size):
+    writer = make_output_writer(os.path.join(tmp_path, 'pano'), 'png')
+    stitch = Stitch(views, tile_size=tile_size, writer=writer)
+    stitch.run()
+
+    assert writer.path.endswith('pano.png')
+    assert array_equal(cv.imread(writer.path), asarray(stitch.stitched_img))
+    stitch.close()
+#
+
+
+def test_png_strips(tmp_path):
+    '''
+    Strips of any height, the rows counted on close
+    '''
+    image  = default_rng(0).integers(0, 256, (101, 77, 3), dtype='uint8')
+    writer = make_output_writer(os.path.join(tmp_path, 'strips'), 'png', compression=1)
+    writer.open(77, 101)
+    for y in range(0, 101, 13):
+        writer.write(image[y:y + 13])
+    # for
+    writer.close()
+    assert array_equal(cv.imread(writer.path), image)
+
+    writer.open(77, 101)
+    writer.write(image[:50])
+    with pytest.raises(ValueError):
+        writer.close()
+    # with
+#
+
+
+def test_dzi_levels(tmp_path, views):
+    writer = make_output_writer(os.path.join(tmp_path, 'pano'), 'dzi', tile_size=100, overlap=1)
+    stitch = Stitch(views, tile_size=64, writer=writer)
+    stitch.run()
+    (height, width) = stitch.stitched_img.shape[:2]
+    stitch.close()
+
+    # Level 0 a single pixel, one more per halving up to the canvas
+    levels = sorted(int(level) for level in os.listdir(os.path.join(tmp_path, 'pano_files')))
+    top    = max(width - 1, height - 1).bit_length()
+    assert levels == list(range(top + 1))
+    assert os.listdir(os.path.join(tmp_path, 'pano_files', '0')) == ['0_0.jpg']
+    assert len(os.listdir(os.path.join(tmp_path, 'pano_files', str(top)))) == -(-width // 100) * -(-height // 100)
+    assert f'Width="{width}" Height="{height}"' in open(writer.path).read()
+#
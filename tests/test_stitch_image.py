@@ -0,0 +1,59 @@
+'''
+Stitch tiled, on a memmap canvas, against the whole canvas rendered at
+once in memory
+'''
+
+import os
+
+import pytest
+from numpy import asarray, abs as np_abs
+
+from blenders     import make_blender
+from stitch_image import Stitch
+
+
+@pytest.fixture
+def untiled(views):
+    stitch = Stitch(views, tile_size=None)
+    stitch.run()
+    return asarray(stitch.stitched_img).astype(int)
+#
+
+
+@pytest.mark.parametrize('tile_size', [64, 200])
+def test_tiled_matches_untiled(views, untiled, tile_size):
+    stitch = Stitch(views, tile_size=tile_size)
+    stitch.run()
+    tiled = asarray(stitch.stitched_img)
+
+    assert tiled.shape == untiled.shape
+    assert np_abs(tiled - untiled).max() <= 1
+    stitch.close()
+    assert stitch.stitched_img is None
+#
+
+
+def test_multiband_tiled_matches_untiled(views):
+    images = []
+    for tile_size in (None, 128):
+        stitch = Stitch(views, tile_size=tile_size, blender=make_blender('multiband'))
+        stitch.run()
+        images.append(asarray(stitch.stitched_img).astype(int))
+        stitch.close()
+    # for
+    assert images[0].shape == images[1].shape
+    assert np_abs(images[0] - images[1]).max() <= 2
+#
+
+
+def test_canvas_path(tmp_path, views, untiled):
+    canvas_path = os.path.join(tmp_path, 'canvas.npy')
+    stitch      = Stitch(views, tile_size=64, canvas_path=canvas_path)
+    stitch.run()
+
+    # The progress of the tiles goes once the canvas is finished
+    assert os.path.isfile(canvas_path)
+    assert os.listdir(tmp_path) == ['canvas.npy']
+    assert np_abs(asarray(stitch.stitched_img) - untiled).max() <= 1
+    stitch.close()
+#